@@ -10,6 +10,8 @@ from telebot import types, apihelper
 from dotenv import load_dotenv, find_dotenv
 from supabase import create_client, Client
 
+from lector_tasas import ultima_tasa
+
 # ==========================================
 # 1. CONFIGURACIÓN Y VARIABLES DE ENTORNO
 # ==========================================
@@ -110,21 +112,19 @@ def obtener_tasa(origen, destino, tipo):
         t = _norm(tipo)
         m = {"publico": "público", "mayorista": "mayorista", "promedio publico": "público promedio", "promedio mayorista": "mayorista promedio"}
         nombre = f"Tasa {m.get(t, 'público')} {origen} - {destino}"
-        res = supabase.table("tasas").select("valor").eq("nombre_tasa", nombre).order("fecha_actual", desc=True).limit(1).execute()
-        return (float(res.data[0]["valor"]), nombre) if res.data else (None, None)
+        valor = ultima_tasa(supabase, nombre)
+        return (valor, nombre) if valor is not None else (None, None)
     except: return None, None
 
 def obtener_tasa_full(origen, destino):
     try:
         nombre = f"Tasa full {origen} - {destino}"
-        res = supabase.table("tasas").select("valor").eq("nombre_tasa", nombre).order("fecha_actual", desc=True).limit(1).execute()
-        return float(res.data[0]["valor"]) if res.data else None
+        return ultima_tasa(supabase, nombre)
     except: return None
 
 def obtener_valor_usdt(origen):
     try:
-        res = supabase.table("tasas").select("valor").eq("nombre_tasa", f"USDT en {origen} (venta)").order("fecha_actual", desc=True).limit(1).execute()
-        return float(res.data[0]["valor"]) if res.data else None
+        return ultima_tasa(supabase, f"USDT en {origen} (venta)")
     except: return None
 
 def next_tracking_code_monthly(message) -> str:
@@ -4,30 +4,26 @@ from datetime import datetime, timedelta
 import os
 import sys
 import logging
-import re
 import requests
 import telebot
 from dotenv import load_dotenv
-from decimal import Decimal, ROUND_DOWN
-import unicodedata
 
 # === 1) CARGA .ENV ANTES DE TODO ===
 load_dotenv(override=True)
 
 # === 2) CONFIG BÁSICA ===
 MODO_TEST = False
+# "webhook" = servidor aiohttp (webhook_servidor.py); por defecto long polling
+MODO_WEBHOOK = os.getenv("BOT_MODO", "polling").strip().lower() == "webhook"
+# Solo bot: sin hilo actualizador ni guardar_tasas/Playwright en el proceso (las corridas las hace cron_worker.py)
+BOT_SOLO = os.getenv("BOT_SOLO", "").strip().lower() in ("1", "true", "yes", "on")
 EXPECTED_BOT_USERNAME = (os.getenv("TASANATOR_USERNAME") or "TasanatorBot").lstrip("@")
 
+from config_bot import clean_token
+
 # Toma el token de Tasanator primero; si no, cae a TELEGRAM_TOKEN para compat
 RAW_TOKEN = os.getenv("TASANATOR_TOKEN") or os.getenv("TELEGRAM_TOKEN")
 
-def clean_token(tok: str) -> str:
-    if not tok:
-        return tok
-    tok = tok.strip()
-    tok = "".join(ch for ch in tok if ch.isalnum() or ch in (":", "_", "-"))
-    return tok
-
 TOKEN = clean_token(RAW_TOKEN)
 if not TOKEN or ":" not in TOKEN:
     print("❌ Token vacío o con formato inválido. Define TASANATOR_TOKEN (recomendado) o TELEGRAM_TOKEN en tu .env.")
@@ -64,8 +60,13 @@ if EXPECTED_BOT_USERNAME and str(me_pre.get("username", "")).lower() != EXPECTED
 
 # === 5) IMPORTS QUE USAN .ENV ===
 from supabase import create_client, Client
-from dateutil import parser
-from guardar_tasas import actualizar_todas_las_tasas
+from lector_tasas import CacheTasas
+from resolver_pares import resolver_par, pais_en_texto
+from tarjetas_tasas import TarjetasTasas, nivel_usuario, texto_estadisticas, COMPLETO, LIMITADO, SOLO_PUBLICO
+from planificador_envios import PlanificadorEnvios
+from suscripciones_pares import suscribir, desuscribir, suscripciones_de, todas_las_suscripciones
+from tiempo_real_tasas import escuchar_en_vivo
+from imagenes_tarjetas import ImagenesTarjetas, IMAGENES_ACTIVAS
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
@@ -74,37 +75,21 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     sys.exit(1)
 
 # === 6) PARSEO DE AUTORIZADOS / RESTRINGIDOS ===
-def _parse_ids(raw: str):
-    out = []
-    for x in (raw or "").split(","):
-        x = x.strip()
-        if not x:
-            continue
-        try:
-            out.append(int(x))
-        except Exception:
-            print(f"⚠️ ID inválido en USUARIOS_AUTORIZADOS: {x!r}")
-    return out
-
-def _parse_id_set(raw: str):
-    out = set()
-    for x in re.split(r"[,\s]+", (raw or "").strip()):
-        if not x:
-            continue
-        try:
-            out.add(int(x))
-        except Exception:
-            print(f"⚠️ ID inválido en lista: {x!r}")
-    return out
-
-USUARIOS_AUTORIZADOS   = _parse_ids(os.getenv("USUARIOS_AUTORIZADOS", ""))
-USUARIOS_LIMITADOS     = _parse_id_set(os.getenv("USUARIO_LIMITADO", "794327412"))
-USUARIOS_RESTRINGIDOS  = _parse_id_set(os.getenv("USUARIO_RESTRINGIDO", "7278912173"))
-USUARIOS_SOLO_PUBLICO  = _parse_id_set(os.getenv("USUARIOS_SOLO_PUBLICO", ""))  # súper restricción
+from config_bot import (
+    USUARIOS_AUTORIZADOS, USUARIOS_LIMITADOS, USUARIOS_RESTRINGIDOS, USUARIOS_SOLO_PUBLICO,
+    emojis_paises, SPECIAL_COPUSDT_BTN, MENSAJE_FUERA_DE_HORARIO, MENSAJE_NO_RECONOCIDO, fuera_de_horario,
+)
 
 # === 7) CLIENTES ===
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-bot = telebot.TeleBot(TOKEN)
+cache_tasas = CacheTasas(supabase)
+tarjetas = TarjetasTasas(cache_tasas)
+escucha_tasas = escuchar_en_vivo(cache_tasas, SUPABASE_URL, SUPABASE_KEY)
+# En webhook los handlers corren en los hilos del servidor, no en el pool de telebot
+bot = telebot.TeleBot(TOKEN, threaded=not MODO_WEBHOOK)
+planificador = PlanificadorEnvios(bot)
+# Tarjetas como PNG (TARJETAS_IMAGEN=1); sin esto se mandan como texto
+imagenes = ImagenesTarjetas(tarjetas, bot) if IMAGENES_ACTIVAS else None
 
 try:
     me = bot.get_me()
@@ -134,124 +119,13 @@ def safe_remove_webhook(b: telebot.TeleBot):
     except Exception as e:
         print(f"ℹ️ safe_remove_webhook: error no crítico: {e}")
 
-safe_remove_webhook(bot)
+if not MODO_WEBHOOK:
+    safe_remove_webhook(bot)
 
 print(f"Conectado a: {SUPABASE_URL}")
 print("USUARIOS_AUTORIZADOS =", USUARIOS_AUTORIZADOS)
 
-# ============ NORMALIZADORES + DECIMALES POR PAR (TRUNCADO) ============
-def _strip_accents(s: str) -> str:
-    return "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
-
-def _norm_pair(p: str) -> str:
-    if not p:
-        return ""
-    s = p.strip().lower()
-    s = s.replace("/", " ").replace("  ", " ")
-    if " - " in s:
-        partes = s.split(" - ")
-    else:
-        partes = s.split("-")
-    if len(partes) == 2:
-        a, b = partes[0].strip(), partes[1].strip()
-    else:
-        toks = s.split()
-        if len(toks) >= 2:
-            a, b = " ".join(toks[:-1]), toks[-1]
-        else:
-            a, b = s, ""
-
-    def std(word: str) -> str:
-        w = word.strip()
-        w = w.replace("euros", "europa")
-        w = w.replace("zelle", "usa")
-        w = w.replace("panama", "panamá")
-        w = w.replace("peru", "perú")
-        w = w.replace("mexico", "méxico")
-        w = w.replace("argentin", "argentina")
-        return w
-
-    a, b = std(a), std(b)
-    a_key = _strip_accents(a)
-    b_key = _strip_accents(b)
-    return f"{a_key} - {b_key}".strip()
-
-# Mapa de decimales por par normalizado (SIN ACENTOS, minúsculas)
-DECIMALS_BY_PAIR = {
-    "chile - venezuela": 4,
-    "chile - colombia": 3,
-    "chile - argentina": 3,
-    "chile - usa": 5,
-    "colombia - venezuela": 2,
-    "colombia - chile": 3,
-    "usa - venezuela": 1,
-    "usa - chile": 1,
-    "mexico - venezuela": 2,
-    "chile - mexico": 4,
-    "chile - peru": 4,
-    "argentina - peru": 4,
-    "argentina - venezuela": 3,
-    "colombia - argentina": 3,
-    "venezuela - colombia": 2,
-    "venezuela - argentina": 2,
-    "venezuela - usa": 5,
-    "usa - colombia": 2,
-    "venezuela - peru": 4,
-    "mexico - colombia": 1,
-    "mexico - argentina": 2,
-    "colombia - mexico": 3,
-    "argentina - chile": 3,
-    "colombia - peru": 5,
-    "panama - venezuela": 1,
-    "argentina - colombia": 2,
-    "ecuador - colombia": 1,
-    "ecuador - venezuela": 1,
-    "europa - venezuela": 1,
-    "europa - chile": 1,
-    "usa - peru": 3,
-    "usa - argentina": 3,
-    "uruguay - venezuela": 3,
-    "chile - panama": 5,
-    "chile - ecuador": 5,
-    "colombia usdt": 2,
-}
-
-def _truncate_value(val, decs):
-    if val is None:
-        return None
-    if decs is None:
-        return float(val)
-    q = Decimal("1." + ("0" * int(decs)))
-    d = Decimal(str(val)).quantize(q, rounding=ROUND_DOWN)
-    return float(d)
-
-def _fmt_trunc(val, decs):
-    if val is None:
-        return "No disponible"
-    if decs is None:
-        return str(val)
-    tv = _truncate_value(val, decs)
-    return f"{tv:.{decs}f}"
-
-# ============ EMOJIS Y PAISES DEL MENÚ ============
-emojis_paises = {
-    "venezuela": "🇻🇪",
-    "colombia": "🇨🇴",
-    "argentina": "🇦🇷",
-    "perú": "🇵🇪",
-    "brasil": "🇧🇷",
-    "europa": "🇪🇺",
-    "usa": "🇺🇸",
-    "méxico": "🇲🇽",
-    "panamá": "🇵🇦",
-    "ecuador": "🇪🇨",
-    "chile": "🇨🇱",
-    "uruguay": "🇺🇾",
-}
-
 # === 8) BOTONES / MENÚ ===
-SPECIAL_COPUSDT_BTN = "💱 COP USDT"
-
 def generar_menu():
     markup = telebot.types.ReplyKeyboardMarkup(resize_keyboard=True)
     markup.row(telebot.types.KeyboardButton(SPECIAL_COPUSDT_BTN))
@@ -260,203 +134,28 @@ def generar_menu():
         markup.row(*botones[i:i+2])
     return markup
 
-def _hoy_iso_ve():
-    return (datetime.utcnow() - timedelta(hours=4)).date().isoformat()
-
-def _listar_tasas_hoy():
-    response = supabase.table("tasas").select("nombre_tasa, fecha_actual, valor").order("fecha_actual", desc=True).execute()
-    return response.data or []
-
 def obtener_pares_disponibles(nombre_pais):
-    hoy = _hoy_iso_ve()
-    data = _listar_tasas_hoy()
-    pais_l = nombre_pais.lower()
-    pares = set()
-    for t in data:
-        nt = (t.get("nombre_tasa") or "").lower()
-        fa = t.get("fecha_actual") or ""
-        if ("tasa full" in nt and "promedio" not in nt and fa.startswith(hoy) and pais_l in nt):
-            par = t["nombre_tasa"].replace("Tasa full ", "")
-            pares.add(par)
-
-    if pais_l == "colombia":
-        for t in data:
-            nt = (t.get("nombre_tasa") or "").lower()
-            fa = t.get("fecha_actual") or ""
-            if fa.startswith(hoy) and nt in ("tasa full cop usdt", "tasa mayorista cop usdt",
-                                             "tasa público cop usdt", "tasa público promedio cop usdt",
-                                             "tasa mayorista promedio cop usdt", "tasa full promedio cop usdt"):
-                pares.add("COP USDT")
-                break
-
-    return sorted(list(pares))
+    cache_tasas.asegurar()
+    return list(cache_tasas.pares_por_pais(emojis_paises).get(nombre_pais.lower(), []))
 
 # === 9) CONSULTAS ===
-def _buscar_valor_hoy(data, nombre_tasa_lower, hoy_iso):
-    for row in data:
-        if (row.get("nombre_tasa") or "").lower() == nombre_tasa_lower and (row.get("fecha_actual") or "").startswith(hoy_iso):
-            valor = float(row["valor"])
-            hora = parser.isoparse(row["fecha_actual"])
-            return valor, hora.strftime("%H:%M")
-    return None, None
-
-def _card_cop_usdt_full_may(pair_key_norm, full_act, full_prom, may_act, may_prom, hora):
-    line = "─" * 28
-    decs = DECIMALS_BY_PAIR.get(pair_key_norm)
-    f_act  = _fmt_trunc(full_act, decs)
-    f_prom = _fmt_trunc(full_prom, decs) if full_prom is not None else "No disponible"
-    m_act  = _fmt_trunc(may_act, decs)
-    m_prom = _fmt_trunc(may_prom, decs) if may_prom is not None else "No disponible"
-
-    return (
-        f"┌{line}┐\n"
-        f"│   💱  COP → USDT (P2P)        │\n"
-        f"├{line}┤\n"
-        f"│  • Tasa Full Actual: {f_act}        │\n"
-        f"│  • Tasa Full Promedio: {f_prom} │\n"
-        f"│  • Tasa Mayorista Actual: {m_act}     │\n"
-        f"│  • Tasa Mayorista Promedio: {m_prom} │\n"
-        f"├{line}┤\n"
-        f"│  🕒 Última actualización: {hora}   │\n"
-        f"└{line}┘"
-    )
-
-def _card_cop_usdt_may_only(pair_key_norm, may_act, may_prom, hora):
-    line = "─" * 28
-    decs = DECIMALS_BY_PAIR.get(pair_key_norm)
-    m_act  = _fmt_trunc(may_act, decs)
-    m_prom = _fmt_trunc(may_prom, decs) if may_prom is not None else "No disponible"
-
-    return (
-        f"┌{line}┐\n"
-        f"│   💱  COP → USDT (P2P)        │\n"
-        f"├{line}┤\n"
-        f"│  • Tasa Mayorista Actual: {m_act}     │\n"
-        f"│  • Tasa Mayorista Promedio: {m_prom} │\n"
-        f"├{line}┤\n"
-        f"│  🕒 Última actualización: {hora}   │\n"
-        f"└{line}┘"
-    )
-
-def _apply_fmt_pair_lines(pair_key_norm, lines: list[tuple[str, float | None]]):
-    decs = DECIMALS_BY_PAIR.get(pair_key_norm)
-    out = []
-    for label, val in lines:
-        out.append(f"{label}: {_fmt_trunc(val, decs)}")
-    return "\n".join(out)
-
 def obtener_tasas_par(nombre_par, user_id):
     try:
-        ahora = datetime.utcnow() - timedelta(hours=4)
-        if ahora.hour < 9:
-            return "🕒 Actualmente estamos fuera de horario laboral (9:00 a.m. - 9:00 p.m.). Por favor, consulta más tarde."
-
-        resp = supabase.table("tasas").select("*").order("fecha_actual", desc=True).execute()
-        data = resp.data or []
-        hoy = ahora.date().isoformat()
-
-        norm = nombre_par.strip().lower().replace("/", " ").replace("  ", " ")
-        pair_key_norm = _norm_pair(nombre_par if norm != "cop usdt" else "colombia usdt")
-
-        if norm == "cop usdt":
-            full_act, hora = _buscar_valor_hoy(data, "tasa full cop usdt", hoy)
-            may_act,  _    = _buscar_valor_hoy(data, "tasa mayorista cop usdt", hoy)
-            full_prom, _   = _buscar_valor_hoy(data, "tasa full promedio cop usdt", hoy)
-            may_prom, _    = _buscar_valor_hoy(data, "tasa mayorista promedio cop usdt", hoy)
-
-            if full_act is None and may_act is None:
-                return "❌ No hay datos disponibles para COP USDT."
-
-            if user_id in USUARIOS_SOLO_PUBLICO:
-                return (
-                    "┌────────────────────────────┐\n"
-                    "│   💱  COP → USDT (P2P)     │\n"
-                    "├────────────────────────────┤\n"
-                    f"│  • Tasa Público: No disponible           │\n"
-                    f"│  • Tasa Público Promedio: No disponible  │\n"
-                    "├────────────────────────────┤\n"
-                    f"│  🕒 Última actualización: {hora or '--:--'}   │\n"
-                    "└────────────────────────────┘"
-                )
-
-            if (user_id in USUARIOS_LIMITADOS) or (user_id in USUARIOS_RESTRINGIDOS):
-                if may_act is None:
-                    return "❌ No hay datos disponibles para COP USDT."
-                return _card_cop_usdt_may_only(pair_key_norm, may_act, may_prom, hora or "--:--")
-
-            if full_act is None or may_act is None:
-                return "❌ No hay datos suficientes disponibles para COP USDT."
-            return _card_cop_usdt_full_may(pair_key_norm, full_act, full_prom, may_act, may_prom, hora or "--:--")
-
-        # --- Flujo normal de pares con " - " ---
-        def buscar(n): return _buscar_valor_hoy(data, n.lower(), hoy)
-        
-        tasa_full_actual, hora_actual = buscar(f"Tasa full {nombre_par}")
-        tasa_full_prom, _             = buscar(f"Tasa full promedio {nombre_par}")
-        
-        tasa_may_actual, _            = buscar(f"Tasa mayorista {nombre_par}")
-        tasa_may_prom, _              = buscar(f"Tasa mayorista promedio {nombre_par}")
-        
-        # ---> NUEVO: Búsqueda de Tasa Promocional <---
-        tasa_promo_actual, _          = buscar(f"Tasa promocional {nombre_par}")
-        tasa_promo_prom, _            = buscar(f"Tasa promocional promedio {nombre_par}")
-        
-        tasa_pub_actual, _            = buscar(f"Tasa público {nombre_par}")
-        tasa_pub_prom, _              = buscar(f"Tasa público promedio {nombre_par}")
-
-        pair_key_norm = _norm_pair(nombre_par)
-
-        if user_id in USUARIOS_SOLO_PUBLICO:
-            if tasa_pub_actual is None:
-                return "❌ No hay datos disponibles para ese par."
-            cuerpo = _apply_fmt_pair_lines(pair_key_norm, [
-                ("Tasa Público Actual", tasa_pub_actual),
-                ("Tasa Público Promedio", tasa_pub_prom),
-            ])
-            return (
-                f"📊 Tasas para {nombre_par}\n\n"
-                f"{cuerpo}\n\n"
-                f"🕒 Última actualización de datos: {hora_actual}"
-            )
-
-        if (user_id in USUARIOS_LIMITADOS) or (user_id in USUARIOS_RESTRINGIDOS):
-            if tasa_pub_actual is None or tasa_may_actual is None:
-                return "❌ No hay datos disponibles para ese par."
-            cuerpo = _apply_fmt_pair_lines(pair_key_norm, [
-                ("Tasa Mayorista Actual", tasa_may_actual),
-                ("Tasa Mayorista Promedio", tasa_may_prom),
-                ("Tasa Promocional Actual", tasa_promo_actual), # <-- NUEVO
-                ("Tasa Promocional Promedio", tasa_promo_prom), # <-- NUEVO
-                ("Tasa Público Actual", tasa_pub_actual),
-                ("Tasa Público Promedio", tasa_pub_prom),
-            ])
-            return (
-                f"📊 Tasas para {nombre_par}\n\n"
-                f"{cuerpo}\n\n"
-                f"🕒 Última actualización de datos: {hora_actual}"
-            )
-
-        if tasa_full_actual is None or tasa_pub_actual is None or tasa_may_actual is None:
-            return "❌ No hay datos suficientes disponibles para ese par."
-
-        cuerpo = _apply_fmt_pair_lines(pair_key_norm, [
-            ("Tasa Full Actual", tasa_full_actual),
-            ("Tasa Full Promedio", tasa_full_prom),
-            ("Tasa Mayorista Actual", tasa_may_actual),
-            ("Tasa Mayorista Promedio", tasa_may_prom),
-            ("Tasa Promocional Actual", tasa_promo_actual), # <-- NUEVO
-            ("Tasa Promocional Promedio", tasa_promo_prom), # <-- NUEVO
-            ("Tasa Público Actual", tasa_pub_actual),
-            ("Tasa Público Promedio", tasa_pub_prom),
-        ])
-        return (
-            f"📊 Tasas para {nombre_par}\n\n"
-            f"{cuerpo}\n\n"
-            f"🕒 Última actualización de datos: {hora_actual}"
-        )
+        if fuera_de_horario():
+            return MENSAJE_FUERA_DE_HORARIO
+
+        nivel = nivel_usuario(user_id, USUARIOS_SOLO_PUBLICO, USUARIOS_LIMITADOS, USUARIOS_RESTRINGIDOS)
+        return tarjetas.obtener(nombre_par, nivel)
     except Exception as e:
         return f"❌ Error obteniendo tasas: {e}"
 
+def enviar_tarjeta(chat_id, nombre_par, user_id):
+    """Tarjeta del par como imagen si están activas; si no (o si falla), como texto."""
+    if imagenes is not None and not fuera_de_horario():
+        nivel = nivel_usuario(user_id, USUARIOS_SOLO_PUBLICO, USUARIOS_LIMITADOS, USUARIOS_RESTRINGIDOS)
+        if imagenes.enviar(chat_id, nombre_par, nivel): return
+    bot.send_message(chat_id, obtener_tasas_par(nombre_par, user_id))
+
 def autorizado(message):
     ok = message.from_user.id in USUARIOS_AUTORIZADOS
     print(f"[auth] from={message.from_user.id} autorizado={ok}")
@@ -477,12 +176,89 @@ def cmd_id(message):
 def cmd_ping(message):
     bot.reply_to(message, "🏓 pong")
 
+@bot.message_handler(commands=["stats"])
+def cmd_stats(message):
+    if not autorizado(message):
+        return
+    texto = texto_estadisticas(cache_tasas, tarjetas)
+    if imagenes is not None:
+        texto += (f"\n• Imágenes: {len(imagenes.png)} en caché | {imagenes.subidas} subidas, "
+                  f"{imagenes.reenvios} reenviadas por file_id")
+    bot.reply_to(message, texto)
+
+@bot.message_handler(commands=["convertir"])
+def cmd_convertir(message):
+    if not autorizado(message):
+        return
+    if fuera_de_horario():
+        bot.reply_to(message, MENSAJE_FUERA_DE_HORARIO)
+        return
+    nivel = nivel_usuario(message.from_user.id, USUARIOS_SOLO_PUBLICO, USUARIOS_LIMITADOS, USUARIOS_RESTRINGIDOS)
+    bot.reply_to(message, tarjetas.convertir((message.text or "").partition(" ")[2], nivel))
+
 @bot.message_handler(commands=["copusdt"])
 def cmd_copusdt(message):
     if not autorizado(message):
         return
-    msg = obtener_tasas_par("COP USDT", message.from_user.id)
-    bot.send_message(message.chat.id, msg)
+    enviar_tarjeta(message.chat.id, "COP USDT", message.from_user.id)
+
+@bot.message_handler(commands=["suscribir"])
+def cmd_suscribir(message):
+    if not autorizado(message):
+        return
+    arg = (message.text or "").partition(" ")[2].strip()
+    if not arg:
+        bot.reply_to(message, "✍️ Uso: /suscribir <par>, por ejemplo /suscribir Chile - Venezuela")
+        return
+    par = tarjetas.par_canonico(arg)
+    if par is None:
+        bot.reply_to(message, f"❌ No hay tasas de hoy para {arg!r}.")
+        return
+    suscribir(supabase, message.chat.id, message.from_user.id, par)
+    bot.reply_to(message, f"🔔 Suscrito a {par}: te llegará la tarjeta después de cada actualización.")
+
+@bot.message_handler(commands=["desuscribir"])
+def cmd_desuscribir(message):
+    if not autorizado(message):
+        return
+    arg = (message.text or "").partition(" ")[2].strip()
+    par = (tarjetas.par_canonico(arg) or arg) if arg else None
+    n = desuscribir(supabase, message.chat.id, par)
+    bot.reply_to(message, f"🔕 Suscripciones quitadas: {n}." if n else "ℹ️ No había suscripciones que quitar.")
+
+@bot.message_handler(commands=["suscripciones"])
+def cmd_suscripciones(message):
+    if not autorizado(message):
+        return
+    pares = suscripciones_de(supabase, message.chat.id)
+    bot.reply_to(message, ("🔔 Suscripciones:\n" + "\n".join(f"• {p}" for p in pares)) if pares
+                 else "ℹ️ No tienes suscripciones. Usa /suscribir <par>.")
+
+# === CONSULTAS INLINE (@TasanatorBot chile venezuela) ===
+INLINE_CACHE_S = int(os.getenv("INLINE_CACHE_S", "60"))
+
+def _resumen_tarjeta(texto):
+    lineas = texto.splitlines()
+    return next((l.strip("│•  ") for l in lineas if "Actual" in l), lineas[0] if lineas else "")[:100]
+
+@bot.inline_handler(func=lambda q: True)
+def consulta_inline(query):
+    user_id = query.from_user.id
+    try:
+        if user_id not in USUARIOS_AUTORIZADOS:
+            bot.answer_inline_query(query.id, [], cache_time=INLINE_CACHE_S, is_personal=True)
+            return
+        resultados = []
+        for i, par in enumerate(tarjetas.buscar_pares(query.query or "")):
+            texto = obtener_tasas_par(par, user_id)
+            resultados.append(telebot.types.InlineQueryResultArticle(
+                id=str(i), title=f"📊 {par}", description=_resumen_tarjeta(texto),
+                input_message_content=telebot.types.InputTextMessageContent(texto),
+            ))
+        # La tarjeta depende del nivel del usuario: el caché de Telegram tiene que ser personal
+        bot.answer_inline_query(query.id, resultados, cache_time=INLINE_CACHE_S, is_personal=True)
+    except Exception as e:
+        print(f"⚠️ Error en consulta inline {query.query!r}: {e}")
 
 # === MENÚ / START ===
 @bot.message_handler(commands=["start"])
@@ -502,34 +278,28 @@ def manejar_mensaje(message):
     print(f"[msg] from={message.from_user.id} chat={message.chat.id} text={texto!r}")
     if not autorizado(message):
         return
-    texto_l = texto.lower()
-
-    if texto == SPECIAL_COPUSDT_BTN or texto_l.replace("/", " ").replace("  ", " ") == "cop usdt":
-        mensaje = obtener_tasas_par("COP USDT", message.from_user.id)
-        bot.send_message(message.chat.id, mensaje)
+    if texto == SPECIAL_COPUSDT_BTN or resolver_par(texto):
+        enviar_tarjeta(message.chat.id, tarjetas.par_canonico(texto) or texto, message.from_user.id)
         return
 
-    if " - " in texto:
-        mensaje = obtener_tasas_par(texto.strip(), message.from_user.id)
-        bot.send_message(message.chat.id, mensaje)
+    pais = pais_en_texto(texto)
+    if pais:
+        pares = obtener_pares_disponibles(pais)
+        if pares:
+            markup = telebot.types.ReplyKeyboardMarkup(resize_keyboard=True)
+            for par in pares:
+                markup.add(telebot.types.KeyboardButton(par))
+            bot.send_message(message.chat.id, f"🔍 Elige un par disponible con {pais.title()}:", reply_markup=markup)
+        else:
+            bot.send_message(message.chat.id, f"❌ No se encontraron pares con {pais.title()}.")
         return
 
-    for pais in emojis_paises:
-        if pais in texto_l:
-            pares = obtener_pares_disponibles(pais)
-            if pares:
-                markup = telebot.types.ReplyKeyboardMarkup(resize_keyboard=True)
-                for par in pares:
-                    markup.add(telebot.types.KeyboardButton(par))
-                bot.send_message(message.chat.id, f"🔍 Elige un par disponible con {pais.title()}:", reply_markup=markup)
-            else:
-                bot.send_message(message.chat.id, f"❌ No se encontraron pares con {pais.title()}.")
-            return
-
-    bot.send_message(message.chat.id, "❌ Comando no reconocido. Escribe /tasas, /copusdt o selecciona una opción.")
+    bot.send_message(message.chat.id, MENSAJE_NO_RECONOCIDO)
 
 # === 11) ACTUALIZACIÓN PERIÓDICA ===
 def actualizar_periodicamente():
+    # Import diferido: el scraper (numpy, Playwright) solo se carga si este hilo corre
+    from guardar_tasas import actualizar_todas_las_tasas
     while True:
         try:
             ahora = datetime.utcnow() - timedelta(hours=4)
@@ -555,8 +325,56 @@ def actualizar_periodicamente():
             print(f"⚠️ Error al actualizar tasas: {e}")
             time.sleep(60)
 
-# === 12) INICIO ===
-print("✅ Modo:", "TEST" if MODO_TEST else "PRODUCCIÓN (9:00–21:00, cada hora)")
-threading.Thread(target=actualizar_periodicamente, daemon=True).start()
+# === 12) DIFUSIÓN A SUSCRIPTORES ===
+DIFUSION_SONDEO_S = float(os.getenv("DIFUSION_SONDEO_S", "20"))
+PRIORIDAD_POR_NIVEL = {COMPLETO: 0, LIMITADO: 1, SOLO_PUBLICO: 2}
+
+def difundir_corrida(run_id):
+    subs = todas_las_suscripciones(supabase)
+    encolados = sin_datos = 0
+    for sub in subs:
+        if sub["user_id"] not in USUARIOS_AUTORIZADOS:
+            continue
+        nivel = nivel_usuario(sub["user_id"], USUARIOS_SOLO_PUBLICO, USUARIOS_LIMITADOS, USUARIOS_RESTRINGIDOS)
+        tarjeta = tarjetas.obtener(sub["par"], nivel)
+        # Un par sin tasas en esta corrida no es una actualización: no se avisa
+        if tarjeta.startswith("❌"):
+            sin_datos += 1
+            continue
+        planificador.encolar(sub["chat_id"], "🔔 Tasas actualizadas\n\n" + tarjeta, prioridad=PRIORIDAD_POR_NIVEL[nivel])
+        encolados += 1
+    print(f"📣 Run {run_id}: {encolados} tarjetas en cola para suscriptores ({sin_datos} sin datos, omitidas).")
+
+def vigilar_corridas():
+    # Lo que ya estaba al arrancar no se difunde; si la tabla venía vacía (run None),
+    # la primera corrida real sí cuenta como nueva
+    ultimo_run = inicial = object()
+    while True:
+        try:
+            tarjetas.asegurar()
+            run_id = cache_tasas.run_id
+            if ultimo_run is inicial:
+                ultimo_run = run_id
+                if imagenes is not None and run_id: imagenes.programar()
+            elif run_id and run_id != ultimo_run:
+                ultimo_run = run_id
+                # Las imágenes se renderizan en su propio hilo, sin frenar la difusión
+                if imagenes is not None: imagenes.programar()
+                difundir_corrida(run_id)
+        except Exception as e:
+            print(f"⚠️ Error en la difusión a suscriptores: {e}")
+        time.sleep(DIFUSION_SONDEO_S)
+
+# === 13) INICIO ===
+if BOT_SOLO:
+    print("✅ Modo: SOLO BOT (las tasas las actualiza cron_worker.py)")
+else:
+    print("✅ Modo:", "TEST" if MODO_TEST else "PRODUCCIÓN (9:00–21:00, cada hora)")
+    threading.Thread(target=actualizar_periodicamente, daemon=True).start()
+threading.Thread(target=vigilar_corridas, daemon=True).start()
 print("🤖 Bot escuchando...")
-bot.infinity_polling(timeout=60, long_polling_timeout=60, skip_pending=True)
\ No newline at end of file
+if MODO_WEBHOOK:
+    from webhook_servidor import servir_webhook
+    servir_webhook(bot)
+else:
+    bot.infinity_polling(timeout=60, long_polling_timeout=60, skip_pending=True)
\ No newline at end of file
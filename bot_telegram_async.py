@@ -0,0 +1,176 @@
+"""Variante asyncio de bot_telegram: AsyncTeleBot + PostgREST async.
+
+Mismos comandos y niveles de permiso que bot_telegram (/tasas, /copusdt,
+menú de países, consulta de pares), pero ninguna consulta bloquea a los
+demás usuarios: las lecturas de Supabase van por un único cliente PostgREST
+async (un solo pool de conexiones para todo el proceso) y las tarjetas salen
+de tarjetas_tasas como en el bot sync.
+
+No corre el actualizador de tasas: las corridas las hace cron_worker.py.
+"""
+import asyncio
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# === 1) CARGA .ENV ANTES DE TODO ===
+load_dotenv(override=True)
+
+import telebot
+from telebot.async_telebot import AsyncTeleBot
+from postgrest import AsyncPostgrestClient
+
+from config_bot import (
+    clean_token,
+    USUARIOS_AUTORIZADOS, USUARIOS_LIMITADOS, USUARIOS_RESTRINGIDOS, USUARIOS_SOLO_PUBLICO,
+    emojis_paises, SPECIAL_COPUSDT_BTN, MENSAJE_FUERA_DE_HORARIO, MENSAJE_NO_RECONOCIDO, fuera_de_horario,
+)
+from lector_tasas import CacheTasasAsync
+from resolver_pares import resolver_par, pais_en_texto
+from tarjetas_tasas import TarjetasTasas, nivel_usuario, texto_estadisticas
+
+# === 2) CONFIG BÁSICA ===
+TOKEN = clean_token(os.getenv("TASANATOR_TOKEN") or os.getenv("TELEGRAM_TOKEN"))
+if not TOKEN or ":" not in TOKEN:
+    print("❌ Token vacío o con formato inválido. Define TASANATOR_TOKEN (recomendado) o TELEGRAM_TOKEN en tu .env.")
+    sys.exit(1)
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+if not SUPABASE_URL or not SUPABASE_KEY:
+    print("❌ Faltan SUPABASE_URL o SUPABASE_KEY en tu .env.")
+    sys.exit(1)
+
+telebot.logger.setLevel(logging.INFO)
+
+# === 3) CLIENTES ===
+# Un solo cliente PostgREST (y su pool httpx) para todo el proceso
+rest = AsyncPostgrestClient(
+    f"{SUPABASE_URL.rstrip('/')}/rest/v1",
+    headers={"apikey": SUPABASE_KEY, "Authorization": f"Bearer {SUPABASE_KEY}"},
+)
+cache_tasas = CacheTasasAsync(rest)
+tarjetas = TarjetasTasas(cache_tasas)
+bot = AsyncTeleBot(TOKEN)
+
+# === 4) MENÚ ===
+def generar_menu():
+    markup = telebot.types.ReplyKeyboardMarkup(resize_keyboard=True)
+    markup.row(telebot.types.KeyboardButton(SPECIAL_COPUSDT_BTN))
+    botones = [telebot.types.KeyboardButton(f"{emoji} {pais.title()}") for pais, emoji in emojis_paises.items()]
+    for i in range(0, len(botones), 2):
+        markup.row(*botones[i:i+2])
+    return markup
+
+async def obtener_pares_disponibles(nombre_pais):
+    await cache_tasas.asegurar_async()
+    return list(cache_tasas.pares_por_pais(emojis_paises).get(nombre_pais.lower(), []))
+
+# === 5) CONSULTAS ===
+async def obtener_tasas_par(nombre_par, user_id):
+    try:
+        if fuera_de_horario():
+            return MENSAJE_FUERA_DE_HORARIO
+
+        await cache_tasas.asegurar_async()
+        nivel = nivel_usuario(user_id, USUARIOS_SOLO_PUBLICO, USUARIOS_LIMITADOS, USUARIOS_RESTRINGIDOS)
+        return tarjetas.obtener(nombre_par, nivel)
+    except Exception as e:
+        return f"❌ Error obteniendo tasas: {e}"
+
+async def autorizado(message):
+    ok = message.from_user.id in USUARIOS_AUTORIZADOS
+    print(f"[auth] from={message.from_user.id} autorizado={ok}")
+    if not ok:
+        try:
+            await bot.reply_to(message, "⛔️ Acceso restringido. No estás autorizado.")
+        except Exception as e:
+            print(f"⚠️ No pude responder rechazo de auth: {e}")
+        return False
+    return True
+
+# === 6) COMANDOS ===
+@bot.message_handler(commands=["id"])
+async def cmd_id(message):
+    await bot.reply_to(message, f"🆔 chat_id: {message.chat.id}\n👤 user_id: {message.from_user.id}")
+
+@bot.message_handler(commands=["ping"])
+async def cmd_ping(message):
+    await bot.reply_to(message, "🏓 pong")
+
+@bot.message_handler(commands=["stats"])
+async def cmd_stats(message):
+    if not await autorizado(message):
+        return
+    await bot.reply_to(message, texto_estadisticas(cache_tasas, tarjetas))
+
+@bot.message_handler(commands=["convertir"])
+async def cmd_convertir(message):
+    if not await autorizado(message):
+        return
+    if fuera_de_horario():
+        await bot.reply_to(message, MENSAJE_FUERA_DE_HORARIO)
+        return
+    await cache_tasas.asegurar_async()
+    nivel = nivel_usuario(message.from_user.id, USUARIOS_SOLO_PUBLICO, USUARIOS_LIMITADOS, USUARIOS_RESTRINGIDOS)
+    await bot.reply_to(message, tarjetas.convertir((message.text or "").partition(" ")[2], nivel))
+
+@bot.message_handler(commands=["copusdt"])
+async def cmd_copusdt(message):
+    if not await autorizado(message):
+        return
+    await bot.send_message(message.chat.id, await obtener_tasas_par("COP USDT", message.from_user.id))
+
+@bot.message_handler(commands=["start"])
+@bot.message_handler(commands=["tasas"])
+@bot.message_handler(func=lambda m: (m.text or "").strip().lower() == "tasas")
+async def mostrar_menu(message):
+    print(f"[menu] from={message.from_user.id} chat={message.chat.id}")
+    if not await autorizado(message):
+        return
+    await bot.send_message(message.chat.id, "🔔 Selecciona un país o usa el acceso rápido:", reply_markup=generar_menu())
+
+@bot.message_handler(func=lambda message: True)
+async def manejar_mensaje(message):
+    texto = (message.text or "").strip()
+    print(f"[msg] from={message.from_user.id} chat={message.chat.id} text={texto!r}")
+    if not await autorizado(message):
+        return
+    if texto == SPECIAL_COPUSDT_BTN or resolver_par(texto):
+        par = tarjetas.par_canonico(texto) or texto
+        await bot.send_message(message.chat.id, await obtener_tasas_par(par, message.from_user.id))
+        return
+
+    pais = pais_en_texto(texto)
+    if pais:
+        pares = await obtener_pares_disponibles(pais)
+        if pares:
+            markup = telebot.types.ReplyKeyboardMarkup(resize_keyboard=True)
+            for par in pares:
+                markup.add(telebot.types.KeyboardButton(par))
+            await bot.send_message(message.chat.id, f"🔍 Elige un par disponible con {pais.title()}:", reply_markup=markup)
+        else:
+            await bot.send_message(message.chat.id, f"❌ No se encontraron pares con {pais.title()}.")
+        return
+
+    await bot.send_message(message.chat.id, MENSAJE_NO_RECONOCIDO)
+
+# === 7) INICIO ===
+async def main():
+    me = await bot.get_me()
+    print(f"🤖 Autenticado como @{me.username} (id={me.id}) — modo asyncio.")
+    await bot.delete_webhook(drop_pending_updates=True)
+    try:
+        await cache_tasas.asegurar_async()
+    except Exception as e:
+        print(f"⚠️ No se pudo precargar la caché de tasas: {e}")
+    try:
+        await bot.infinity_polling(timeout=60, skip_pending=True)
+    finally:
+        await rest.aclose()
+        await bot.close_session()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,218 @@
+"""Motor de captura concurrente para guardar_tasas.
+
+Captura todos los mercados a la vez con un límite de concurrencia y un
+timeout por mercado, por HTTP directo con Playwright async como respaldo. El resultado respeta el orden de entrada para que el
+guardado posterior sea determinista.
+"""
+import asyncio
+import os
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import guardar_tasas as gt
+from cliente_p2p import ClienteP2PAsync, RechazoDirecto, HTTP_DIRECTO, MAX_RECHAZOS_SEGUIDOS
+
+# ------- Configuración -------
+CONCURRENCIA = int(os.getenv("CAPTURA_CONCURRENCIA", "4"))
+TIMEOUT_MERCADO_S = float(os.getenv("CAPTURA_TIMEOUT_MERCADO_S", "180"))
+
+# (label, fiat, side, method, countries)
+Mercado = Tuple[str, str, str, Optional[str], Optional[List[str]]]
+
+# ------- Sesión async -------
+class SesionNavegadorAsync:
+    """HTTP directo primero; Chromium (uno, con una página por fiat) solo si hace falta."""
+
+    def __init__(self, headless: bool = True, http_directo: bool = HTTP_DIRECTO):
+        self.headless = headless
+        self.http_directo = http_directo
+        self.lanzamientos = 0
+        self.directas = 0
+        self.por_navegador = 0
+        self.cache_hits = 0
+        # Una tarea por página cruda: mercados concurrentes comparten la misma descarga
+        self._cache: Dict[Tuple, asyncio.Future] = {}
+        self._rechazos_seguidos = 0
+        self._http: Optional[ClienteP2PAsync] = None
+        self._pw = None
+        self._browser = None
+        self._ctx = None
+        self._lock_browser = asyncio.Lock()
+        self._paginas: Dict[str, Any] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def __aenter__(self):
+        if self.http_directo: self._http = ClienteP2PAsync()
+        return self
+
+    async def __aexit__(self, *exc):
+        try:
+            if self._http is not None: await self._http.cerrar()
+            if self._browser is not None: await self._browser.close()
+        finally:
+            if self._pw is not None: await self._pw.stop()
+
+    def estadisticas(self) -> Dict[str, int]:
+        return {"lanzamientos": self.lanzamientos, "directas": self.directas,
+                "navegador": self.por_navegador, "cache": self.cache_hits}
+
+    async def _asegurar_browser(self):
+        async with self._lock_browser:
+            if self._ctx is not None: return
+            from playwright.async_api import async_playwright
+            self._pw = await async_playwright().start()
+            self._browser = await self._pw.chromium.launch(headless=self.headless)
+            self._ctx = await self._browser.new_context(locale="es-ES")
+            self.lanzamientos += 1
+            print("🌐 Chromium iniciado para el motor concurrente.")
+
+    async def pagina(self, fiat: str, side: str = "BUY"):
+        await self._asegurar_browser()
+        lock = self._locks.setdefault(fiat, asyncio.Lock())
+        async with lock:
+            pg = self._paginas.get(fiat)
+            if pg is None or pg.is_closed():
+                pg = await self._ctx.new_page()
+                await pg.goto(gt.page_url(fiat, side), wait_until="domcontentloaded")
+                self._paginas[fiat] = pg
+            return pg
+
+    async def _buscar_directo(self, fiat, side, countries, pay_types, page_no, publisher_type):
+        try:
+            items = await self._http.buscar(fiat, side, countries, pay_types, page_no, publisher_type)
+        except RechazoDirecto as e:
+            self._rechazos_seguidos += 1
+            print(f"↩️ HTTP directo rechazado ({fiat} {side} p{page_no}): {e}. Se usa el navegador.")
+            if self._rechazos_seguidos >= MAX_RECHAZOS_SEGUIDOS:
+                print("↩️ Demasiados rechazos seguidos: resto de la corrida por navegador.")
+                self.http_directo = False
+            return None
+        self._rechazos_seguidos = 0
+        self.directas += 1
+        return items
+
+    async def buscar(self, fiat: str, side: str, countries: Optional[List[str]],
+                     pay_types: Optional[List[str]], page_no: int,
+                     publisher_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        key = gt.clave_pagina(fiat, side, countries, pay_types, page_no, publisher_type)
+        tarea = self._cache.get(key)
+        if tarea is None:
+            tarea = asyncio.ensure_future(self._descargar(fiat, side, countries, pay_types, page_no, publisher_type))
+            tarea.add_done_callback(lambda t, k=key: self._olvidar_si_fallo(k, t))
+            self._cache[key] = tarea
+        else:
+            self.cache_hits += 1
+        # shield: si un mercado cancela su espera, la descarga sigue para los demás
+        return await asyncio.shield(tarea)
+
+    def _olvidar_si_fallo(self, key: Tuple, tarea: asyncio.Future):
+        if tarea.cancelled() or tarea.exception() is not None:
+            self._cache.pop(key, None)
+
+    async def _descargar(self, fiat: str, side: str, countries: Optional[List[str]],
+                         pay_types: Optional[List[str]], page_no: int,
+                         publisher_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        if self.http_directo and self._http is not None:
+            items = await self._buscar_directo(fiat, side, countries, pay_types, page_no, publisher_type)
+            if items is not None: return items
+
+        self.por_navegador += 1
+        payload = gt.payload_busqueda(fiat, side, countries, pay_types, page_no, publisher_type)
+        pg = await self.pagina(fiat, side)
+        data = await pg.evaluate(gt.FETCH_JS, {"api": gt.API_SEARCH, "payload": payload})
+        return (data or {}).get("data") or []
+
+# ------- Capturas (mismas reglas que guardar_tasas) -------
+async def _first_page(s: SesionNavegadorAsync, fiat: str, side: str, countries: Optional[List[str]]):
+    async def _try(cset): return await s.buscar(fiat, side, cset, None, 1, publisher_type="merchant")
+
+    if fiat == "CLP":
+        items = await _try(None)
+        if not items: items = await _try(["CL"])
+        if not items and countries is not None: items = await _try(countries)
+    else:
+        items = await _try(countries)
+    return gt._cerrar_first_page(items, side)
+
+async def _method_page_exact(s: SesionNavegadorAsync, fiat: str, side: str, method_label: str, need_n: int):
+    items = await s.buscar(fiat, side, None, gt.PAYTYPE_IDS.get(method_label, []), 1, publisher_type="merchant")
+    return gt._cerrar_method_exact(items, side, need_n, dedupe_verified=True)
+
+async def _paginar_pasada(s: SesionNavegadorAsync, fiat: str, side: str, method_label: str,
+                          cset: Optional[List[str]], pay_types: Optional[List[str]], por_keyword: bool,
+                          seen: set, collected: List[Dict[str, Any]], need_n: int):
+    """Igual que guardar_tasas._paginar_pasada: ventanas de páginas, con a lo sumo
+    PAGINAS_EN_VUELO pedidas por delante de la que se lee.
+
+    Al juntar ``need_n`` o llegar una página vacía, las páginas siguientes no se
+    piden. Las descargas ya en curso no se cortan (buscar las protege con shield
+    porque otro mercado puede estar esperando la misma página) y quedan en la caché.
+    """
+    clave = gt.clave_profundidad(fiat, side, method_label, cset, por_keyword)
+    start, ventana, usadas = 1, gt.ventana_inicial(clave), 0
+    while start <= gt.MAX_PAGES_METHOD:
+        paginas = list(range(start, min(start + ventana, gt.MAX_PAGES_METHOD + 1)))
+        tareas: Dict[int, asyncio.Future] = {}
+        try:
+            for i, page_no in enumerate(paginas):
+                for n in paginas[i:i + gt.PAGINAS_EN_VUELO]:
+                    if n not in tareas:
+                        tareas[n] = asyncio.ensure_future(s.buscar(fiat, side, cset, pay_types, n, publisher_type="merchant"))
+                usadas = page_no
+                arr = gt._preparar_pagina_metodo(await tareas[page_no], method_label, por_keyword)
+                gt._acumular_nuevos(arr, seen, collected, need_n)
+                if len(collected) >= need_n or not arr:
+                    gt.aprender_profundidad(clave, usadas)
+                    return
+        finally:
+            for tarea in tareas.values(): tarea.cancel()
+            await asyncio.gather(*tareas.values(), return_exceptions=True)
+        start, ventana = paginas[-1] + 1, gt.VENTANA_PAGINAS
+    gt.aprender_profundidad(clave, usadas)
+
+async def _method_topN(s: SesionNavegadorAsync, fiat: str, side: str, method_label: str,
+                       countries: Optional[List[str]], need_n: int):
+    collected: List[Dict[str, Any]] = []
+    seen_advnos = set()
+    for cset, pay_types, por_keyword in gt._pasadas_metodo(method_label, countries):
+        await _paginar_pasada(s, fiat, side, method_label, cset, pay_types, por_keyword, seen_advnos, collected, need_n)
+        if len(collected) >= need_n: break
+    return gt._cerrar_topN(collected, side, need_n)
+
+async def capturar_mercado(s: SesionNavegadorAsync, mercado: Mercado) -> List[Dict[str, Any]]:
+    label, fiat, side, method, countries = mercado
+    side_u = side.upper()
+    _, need_n = gt.parametros_mercado(label, side_u)
+    if gt._es_zelle_usd(fiat, method):
+        return await _method_page_exact(s, fiat, side_u, "Zelle", need_n=10)
+    if method:
+        return await _method_topN(s, fiat, side_u, method, countries, need_n)
+    return await _first_page(s, fiat, side_u, countries)
+
+# ------- Motor -------
+async def _capturar_uno(s: SesionNavegadorAsync, sem: asyncio.Semaphore, mercado: Mercado,
+                        timeout_s: float) -> Optional[List[Dict[str, Any]]]:
+    label, fiat, side = mercado[0], mercado[1], mercado[2]
+    async with sem:
+        t0 = time.perf_counter()
+        try:
+            items = await asyncio.wait_for(capturar_mercado(s, mercado), timeout=timeout_s)
+            print(f"📥 {label} {fiat} {side}: {len(items)} ofertas en {time.perf_counter() - t0:.1f}s")
+            return items
+        except asyncio.TimeoutError:
+            print(f"⌛ {label} {fiat} {side}: timeout tras {timeout_s:.0f}s")
+        except Exception as e:
+            print(f"❌ {label} {fiat} {side}: error en captura: {e}")
+    return None
+
+async def capturar_mercados(mercados: List[Mercado], concurrencia: int = CONCURRENCIA,
+                            timeout_s: float = TIMEOUT_MERCADO_S) -> Tuple[List[Optional[List[Dict[str, Any]]]], Dict[str, int]]:
+    """Items por mercado, en el mismo orden que ``mercados`` (None si falló), y estadísticas."""
+    sem = asyncio.Semaphore(max(1, concurrencia))
+    async with SesionNavegadorAsync() as s:
+        capturas = await asyncio.gather(*(_capturar_uno(s, sem, m, timeout_s) for m in mercados))
+        return list(capturas), s.estadisticas()
+
+def capturar_todos(mercados: List[Mercado], concurrencia: int = CONCURRENCIA,
+                   timeout_s: float = TIMEOUT_MERCADO_S) -> Tuple[List[Optional[List[Dict[str, Any]]]], Dict[str, int]]:
+    return asyncio.run(capturar_mercados(mercados, concurrencia, timeout_s))
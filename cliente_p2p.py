@@ -0,0 +1,107 @@
+"""Cliente HTTP directo para /bapi/c2c/v2/friendly/c2c/adv/search.
+
+Evita levantar Chromium para cada búsqueda: usa un pool httpx con keep-alive
+(HTTP/2 si el paquete ``h2`` está instalado) y cabeceras de navegador. Si el
+endpoint rechaza la llamada se lanza ``RechazoDirecto`` y quien llama cae al
+camino Playwright.
+"""
+import os
+from typing import List, Dict, Any, Optional
+
+import httpx
+
+from guardar_tasas import BASE, API_SEARCH, page_url, payload_busqueda
+
+# ------- Configuración -------
+HTTP_DIRECTO = os.getenv("P2P_HTTP_DIRECTO", "1").strip().lower() in ("1", "true", "yes", "on")
+TIMEOUT_S = float(os.getenv("P2P_HTTP_TIMEOUT_S", "20"))
+MAX_CONEXIONES = int(os.getenv("P2P_HTTP_MAX_CONEXIONES", "10"))
+# Tras estos rechazos seguidos se deja de intentar el camino directo en la corrida
+MAX_RECHAZOS_SEGUIDOS = 3
+
+HEADERS = {
+    "user-agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"),
+    "accept": "*/*",
+    "accept-language": "es-ES,es;q=0.9,en;q=0.8",
+    "content-type": "application/json",
+    "origin": BASE,
+    "clienttype": "web",
+    "lang": "es",
+}
+
+class RechazoDirecto(Exception):
+    """El endpoint no aceptó la llamada directa (WAF, captcha, código de error)."""
+
+def _http2_disponible() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _opciones_cliente() -> Dict[str, Any]:
+    return {
+        "http2": _http2_disponible(),
+        "headers": HEADERS,
+        "timeout": TIMEOUT_S,
+        "limits": httpx.Limits(max_connections=MAX_CONEXIONES, max_keepalive_connections=MAX_CONEXIONES),
+    }
+
+def _extraer_items(resp: httpx.Response) -> List[Dict[str, Any]]:
+    if resp.status_code >= 400:
+        raise RechazoDirecto(f"HTTP {resp.status_code}")
+    try:
+        body = resp.json()
+    except ValueError:
+        # Página HTML de captcha / WAF en lugar de JSON
+        raise RechazoDirecto("respuesta no JSON")
+    if not isinstance(body, dict):
+        raise RechazoDirecto("respuesta inesperada")
+    code = body.get("code")
+    if body.get("success") is False or (code is not None and str(code) != "000000"):
+        raise RechazoDirecto(f"code={code} message={body.get('message')}")
+    return body.get("data") or []
+
+def _request(fiat: str, side: str, countries: Optional[List[str]], pay_types: Optional[List[str]],
+             page_no: int, publisher_type: Optional[str]) -> Dict[str, Any]:
+    return {
+        "json": payload_busqueda(fiat, side, countries, pay_types, page_no, publisher_type),
+        "headers": {"referer": page_url(fiat, side)},
+    }
+
+class ClienteP2P:
+    """Pool HTTP síncrono compartido por toda la corrida."""
+
+    def __init__(self):
+        self._client = httpx.Client(**_opciones_cliente())
+
+    def buscar(self, fiat: str, side: str, countries: Optional[List[str]],
+               pay_types: Optional[List[str]], page_no: int,
+               publisher_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        try:
+            resp = self._client.post(API_SEARCH, **_request(fiat, side, countries, pay_types, page_no, publisher_type))
+        except httpx.HTTPError as e:
+            raise RechazoDirecto(f"error de red: {e}")
+        return _extraer_items(resp)
+
+    def cerrar(self):
+        self._client.close()
+
+class ClienteP2PAsync:
+    """Pool HTTP async para captura_async."""
+
+    def __init__(self):
+        self._client = httpx.AsyncClient(**_opciones_cliente())
+
+    async def buscar(self, fiat: str, side: str, countries: Optional[List[str]],
+                     pay_types: Optional[List[str]], page_no: int,
+                     publisher_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        try:
+            resp = await self._client.post(API_SEARCH, **_request(fiat, side, countries, pay_types, page_no, publisher_type))
+        except httpx.HTTPError as e:
+            raise RechazoDirecto(f"error de red: {e}")
+        return _extraer_items(resp)
+
+    async def cerrar(self):
+        await self._client.aclose()
@@ -0,0 +1,67 @@
+"""Configuración compartida por bot_telegram y bot_telegram_async.
+
+Se importa después de load_dotenv(): los permisos salen del entorno.
+"""
+import os
+import re
+from datetime import datetime, timedelta
+
+def clean_token(tok: str) -> str:
+    if not tok:
+        return tok
+    tok = tok.strip()
+    tok = "".join(ch for ch in tok if ch.isalnum() or ch in (":", "_", "-"))
+    return tok
+
+# === PARSEO DE AUTORIZADOS / RESTRINGIDOS ===
+def parse_ids(raw: str):
+    out = []
+    for x in (raw or "").split(","):
+        x = x.strip()
+        if not x:
+            continue
+        try:
+            out.append(int(x))
+        except Exception:
+            print(f"⚠️ ID inválido en USUARIOS_AUTORIZADOS: {x!r}")
+    return out
+
+def parse_id_set(raw: str):
+    out = set()
+    for x in re.split(r"[,\s]+", (raw or "").strip()):
+        if not x:
+            continue
+        try:
+            out.add(int(x))
+        except Exception:
+            print(f"⚠️ ID inválido en lista: {x!r}")
+    return out
+
+USUARIOS_AUTORIZADOS   = parse_ids(os.getenv("USUARIOS_AUTORIZADOS", ""))
+USUARIOS_LIMITADOS     = parse_id_set(os.getenv("USUARIO_LIMITADO", "794327412"))
+USUARIOS_RESTRINGIDOS  = parse_id_set(os.getenv("USUARIO_RESTRINGIDO", "7278912173"))
+USUARIOS_SOLO_PUBLICO  = parse_id_set(os.getenv("USUARIOS_SOLO_PUBLICO", ""))  # súper restricción
+
+# === EMOJIS Y PAISES DEL MENÚ ===
+emojis_paises = {
+    "venezuela": "🇻🇪",
+    "colombia": "🇨🇴",
+    "argentina": "🇦🇷",
+    "perú": "🇵🇪",
+    "brasil": "🇧🇷",
+    "europa": "🇪🇺",
+    "usa": "🇺🇸",
+    "méxico": "🇲🇽",
+    "panamá": "🇵🇦",
+    "ecuador": "🇪🇨",
+    "chile": "🇨🇱",
+    "uruguay": "🇺🇾",
+}
+
+SPECIAL_COPUSDT_BTN = "💱 COP USDT"
+
+MENSAJE_FUERA_DE_HORARIO = "🕒 Actualmente estamos fuera de horario laboral (9:00 a.m. - 9:00 p.m.). Por favor, consulta más tarde."
+MENSAJE_NO_RECONOCIDO = "❌ Comando no reconocido. Escribe /tasas, /copusdt o selecciona una opción."
+
+def fuera_de_horario() -> bool:
+    return (datetime.utcnow() - timedelta(hours=4)).hour < 9
@@ -0,0 +1,12 @@
+"""Sentido de los pares, compartido por guardar_tasas (cálculo) y los bots (conversión)."""
+
+# En estos pares la tasa es moneda origen por unidad de destino: se suma el margen
+pares_sumar_margen = {"Chile - USA", "Colombia - Venezuela"}
+
+def par_invertido(base: str) -> bool:
+    """True si para convertir origen -> destino hay que dividir por la tasa.
+
+    Con destino USA el par siempre va en sentido directo, igual que en
+    motor_pares.MatrizPares.
+    """
+    return base in pares_sumar_margen and not base.endswith(" - USA")
@@ -28,7 +28,7 @@ ensure_playwright_browsers()
 from guardar_tasas import actualizar_todas_las_tasas
 
 try:
-    from guardar_tasas import actualizar_todas_las_tasas
+    from guardar_tasas import actualizar_todas_las_tasas, SesionNavegador
 except Exception as e:
     print(f"⚠️ No se pudo importar actualizar_todas_las_tasas desde guardar_tasas: {e}")
     raise
@@ -47,6 +47,10 @@ WINDOW_START_HOUR = int(os.getenv("WINDOW_START_HOUR", "9"))
 WINDOW_END_HOUR   = int(os.getenv("WINDOW_END_HOUR", "21"))   # inclusive
 ALWAYS_ON = os.getenv("ALWAYS_ON", "").strip().lower() in ("1","true","yes","on")
 
+# Mantener Chromium caliente entre ticks (evita el arranque en frío cada hora).
+# Tiene prioridad sobre CAPTURA_CONCURRENTE: con la sesión caliente la captura es secuencial.
+NAVEGADOR_CALIENTE = os.getenv("CRON_NAVEGADOR_CALIENTE", "").strip().lower() in ("1","true","yes","on")
+
 INTERVAL = timedelta(minutes=CRON_INTERVAL_MIN)
 
 def local_now(tzname=TZ_NAME):
@@ -86,7 +90,9 @@ def next_window_open(dt):
 if __name__ == "__main__":
     print(f"⏱️ Cron activo. Ventana: "
           f"{'SIEMPRE' if ALWAYS_ON else f'{WINDOW_START_HOUR}:00–{WINDOW_END_HOUR}:00'} {TZ_NAME} "
-          f"| intervalo={CRON_INTERVAL_MIN}min | FORCE_RUN={FORCE_RUN}")
+          f"| intervalo={CRON_INTERVAL_MIN}min | FORCE_RUN={FORCE_RUN} | navegador_caliente={NAVEGADOR_CALIENTE}")
+
+    sesion = SesionNavegador() if NAVEGADOR_CALIENTE else None
 
     now = local_now()
     next_run = now if FORCE_RUN else (align_to_next_tick(now) if in_window(now) else next_window_open(now))
@@ -106,9 +112,12 @@ if __name__ == "__main__":
             if FORCE_RUN or now >= next_run:
                 print(f"🔄 Ejecutando actualización {now.isoformat()}")
                 try:
-                    actualizar_todas_las_tasas()
+                    actualizar_todas_las_tasas(sesion=sesion)
                 except Exception as e:
                     print(f"❌ Error en bucle principal: {e}")
+                    if sesion is not None:
+                        # Ante un fallo, no arrastrar un navegador en mal estado al siguiente tick
+                        sesion.cerrar()
                 base = now if now > next_run else next_run
                 next_run = align_to_next_tick(base)
                 FORCE_RUN = False
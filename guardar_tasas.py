@@ -1,8 +1,34 @@
-from typing import List, Tuple, Dict, Any, Optional
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from collections import deque
+from typing import List, Tuple, Dict, Any, Optional, Iterator, Set
 from datetime import datetime, timedelta
 from decimal import Decimal
 
-from playwright.sync_api import sync_playwright
+from dateutil.parser import isoparse
+
+try:
+    import resource  # solo Unix; en Windows no se reporta RSS
+except ImportError:
+    resource = None
+
+try:
+    import fcntl  # solo Unix; en Windows no hay candado entre procesos
+except ImportError:
+    fcntl = None
+
+import numpy as np
+
+from config_pares import pares_sumar_margen
+from lector_tasas import iterar_tasas
+from motor_pares import matriz_para
+from snapshot_tasas import SNAPSHOT_PATH, leer_snapshot, publicar_snapshot
 from supabase_client import supabase
 
 # ------- Constantes -------
@@ -13,6 +39,24 @@ ROWS = 20
 TIMEOUT_MS = 60000
 TOP_N = 5
 MAX_PAGES_METHOD = 15  # hasta cuántas páginas intentar al buscar por método
+# Paginación especulativa: cuántas páginas se piden a la vez cuando no hay historial
+VENTANA_PAGINAS = int(os.getenv("PAGINAS_VENTANA", "4"))
+# Dentro de una ventana, cuántas páginas se piden por delante de la que se está leyendo;
+# las siguientes recién se piden al avanzar, así una página vacía corta sin gastar el resto
+PAGINAS_EN_VUELO = max(1, int(os.getenv("PAGINAS_EN_VUELO", "2")))
+# JSON opcional donde persistir la profundidad aprendida entre reinicios
+PROFUNDIDAD_PATH = os.getenv("PAGINAS_PROFUNDIDAD_PATH", "")
+# Promedios: "ultimos" (media de los últimos N) o "ponderado" (decaimiento por antigüedad)
+PROMEDIO_MODO = os.getenv("PROMEDIO_MODO", "ultimos").strip().lower()
+PROMEDIO_VENTANA = int(os.getenv("PROMEDIO_VENTANA", "2"))  # puntos, incluido el valor actual
+PROMEDIO_VIDA_MEDIA_H = float(os.getenv("PROMEDIO_VIDA_MEDIA_H", "1"))  # solo modo ponderado
+PROMEDIO_HISTORIA_H = float(os.getenv("PROMEDIO_HISTORIA_H", "48"))  # hasta dónde mirar al cargar
+# Captura concurrente de mercados (captura_async); "0" vuelve al modo secuencial.
+# Si quien llama pasa una sesión caliente (cron_worker con CRON_NAVEGADOR_CALIENTE), gana la
+# sesión: se captura en secuencia con ella, porque el motor async abre su Chromium en cada corrida.
+CAPTURA_CONCURRENTE = os.getenv("CAPTURA_CONCURRENTE", "1").strip().lower() in ("1", "true", "yes", "on")
+# Candado de archivo: una sola corrida a la vez entre procesos (bot, cron_worker); "" lo desactiva
+CORRIDA_LOCK_PATH = os.getenv("CORRIDA_LOCK_PATH", os.path.join(tempfile.gettempdir(), "tasanator_corrida.lock"))
 
 # ------- PayTypes + keywords -------
 PAYTYPE_IDS: Dict[str, List[str]] = {
@@ -119,8 +163,6 @@ margenes_personalizados["Argentina - Perú"] = {"publico": 0.07, "mayorista": 0.
 margenes_personalizados["Perú - USA"] = {"publico": 0.10, "mayorista": 0.07}
 margenes_personalizados["Argentina - USA"] = {"publico": 0.10, "mayorista": 0.07}
 
-pares_sumar_margen = {"Chile - USA", "Colombia - Venezuela"}
-
 def margen_por_defecto(base: str) -> Dict[str, float]:
     if base.startswith("Uruguay - ") or base.endswith(" - Uruguay"):
         return {"publico": 0.07, "mayorista": 0.04}
@@ -129,15 +171,8 @@ def margen_por_defecto(base: str) -> Dict[str, float]:
     return {"publico": 0.07, "mayorista": 0.045}
 
 # ------- Decimales dinámicos -------
-def decimales_auto(t: float, origen: str, destino: str) -> int:
-    base_rule = 5 if (origen == "Chile" and destino in ["Panamá", "Ecuador", "Europa", "Brasil"]) else 4
-    if t < 0.0001: mag_rule = 8
-    elif t < 0.01: mag_rule = 6
-    elif t < 1: mag_rule = 5
-    elif t < 100: mag_rule = 4
-    elif t < 1000: mag_rule = 3
-    else: mag_rule = 2
-    return max(base_rule, mag_rule)
+def decimales_base(origen: str, destino: str) -> int:
+    return 5 if (origen == "Chile" and destino in ["Panamá", "Ecuador", "Europa", "Brasil"]) else 4
 
 # ------- Utilidades -------
 def page_url(fiat: str, side: str) -> str:
@@ -252,124 +287,387 @@ def _filter_tradable(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return out
 
 # --- Peticiones ---
-def fetch_ui_page(page, fiat: str, side: str, countries: Optional[List[str]],
-                  pay_types: Optional[List[str]], page_no: int,
-                  publisher_type: Optional[str] = None):
-    api = f"{BASE}/bapi/c2c/v2/friendly/c2c/adv/search"
-    payload = {
+API_SEARCH = f"{BASE}/bapi/c2c/v2/friendly/c2c/adv/search"
+
+FETCH_JS = """async ({api, payload}) => {
+    const r = await fetch(api, {
+      method: 'POST',
+      headers: {'content-type':'application/json'},
+      body: JSON.stringify(payload)
+    });
+    return await r.json();
+}"""
+
+FETCH_VENTANA_JS = """async ({api, payloads}) => {
+    return await Promise.all(payloads.map(async (payload) => {
+        const r = await fetch(api, {
+          method: 'POST',
+          headers: {'content-type':'application/json'},
+          body: JSON.stringify(payload)
+        });
+        return await r.json();
+    }));
+}"""
+
+def clave_pagina(fiat: str, side: str, countries: Optional[List[str]],
+                 pay_types: Optional[List[str]], page_no: int,
+                 publisher_type: Optional[str] = None) -> Tuple:
+    """Clave de la caché de páginas crudas de una corrida."""
+    return (fiat, side.upper(), tuple(countries or ()), tuple(pay_types or ()), page_no, publisher_type or "")
+
+def payload_busqueda(fiat: str, side: str, countries: Optional[List[str]],
+                     pay_types: Optional[List[str]], page_no: int,
+                     publisher_type: Optional[str] = None) -> Dict[str, Any]:
+    return {
         "page": page_no, "rows": ROWS, "asset": ASSET,
         "tradeType": side.upper(), "fiat": fiat,
         "publisherType": publisher_type,
         "payTypes": pay_types or [], "countries": countries or []
     }
-    data = page.evaluate(
-        """async ({api, payload}) => {
-            const r = await fetch(api, {
-              method: 'POST',
-              headers: {'content-type':'application/json'},
-              body: JSON.stringify(payload)
-            });
-            return await r.json();
-        }""",
-        {"api": api, "payload": payload}
-    )
-    return (data or {}).get("data") or []
 
-def capture_first_page(fiat: str, side: str, countries: Optional[List[str]]) -> List[Dict[str, Any]]:
-    url = page_url(fiat, side)
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        ctx = browser.new_context(locale="es-ES")
-        pg = ctx.new_page()
-        pg.goto(url, wait_until="domcontentloaded")
+def fetch_ui_pages(page, fiat: str, side: str, countries: Optional[List[str]],
+                   pay_types: Optional[List[str]], pages: List[int],
+                   publisher_type: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+    """Varias páginas en paralelo dentro del mismo contexto (Promise.all: la tanda va entera)."""
+    payloads = [payload_busqueda(fiat, side, countries, pay_types, n, publisher_type) for n in pages]
+    datos = page.evaluate(FETCH_VENTANA_JS, {"api": API_SEARCH, "payloads": payloads}) or []
+    return [(d or {}).get("data") or [] for d in datos]
+
+# ------- Sesión de navegador -------
+class SesionNavegador:
+    """Sesión de captura de una corrida.
+
+    Intenta primero el cliente HTTP directo (cliente_p2p) y solo levanta
+    Chromium, una vez y con una página por fiat, cuando la llamada directa
+    es rechazada. Puede mantenerse viva entre corridas (cron_worker)
+    llamando a ``reiniciar_paginas()`` al terminar cada una y ``cerrar()``
+    al salir.
+    """
+
+    def __init__(self, headless: bool = True, http_directo: Optional[bool] = None):
+        from cliente_p2p import HTTP_DIRECTO
+        self.headless = headless
+        self._http_directo_cfg = HTTP_DIRECTO if http_directo is None else http_directo
+        self.http_directo = self._http_directo_cfg
+        self.lanzamientos = 0
+        self.directas = 0
+        self.por_navegador = 0
+        self.cache_hits = 0
+        # Páginas crudas descargadas en la corrida, por clave_pagina()
+        self._cache: Dict[Tuple, List[Dict[str, Any]]] = {}
+        self._rechazos_seguidos = 0
+        self._lock_stats = threading.Lock()
+        self._http = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pw = None
+        self._browser = None
+        self._ctx = None
+        self._paginas: Dict[str, Any] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def estadisticas(self) -> Dict[str, int]:
+        return {"lanzamientos": self.lanzamientos, "directas": self.directas,
+                "navegador": self.por_navegador, "cache": self.cache_hits}
+
+    def _asegurar_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return
+        self._cerrar_browser()
+        if self._pw is None:
+            from playwright.sync_api import sync_playwright
+            self._pw = sync_playwright().start()
+        self._browser = self._pw.chromium.launch(headless=self.headless)
+        self._ctx = self._browser.new_context(locale="es-ES")
+        self.lanzamientos += 1
+        print(f"🌐 Chromium iniciado (arranque #{self.lanzamientos}).")
+
+    def pagina(self, fiat: str, side: str = "BUY"):
+        pg = self._paginas.get(fiat)
+        if pg is not None and not pg.is_closed():
+            return pg
+        self._asegurar_browser()
+        pg = self._ctx.new_page()
+        pg.goto(page_url(fiat, side), wait_until="domcontentloaded")
+        self._paginas[fiat] = pg
+        return pg
+
+    def _cliente_http(self):
+        if self._http is None:
+            from cliente_p2p import ClienteP2P
+            self._http = ClienteP2P()
+        return self._http
+
+    def _pool_http(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=PAGINAS_EN_VUELO, thread_name_prefix="p2p")
+        return self._pool
+
+    def _buscar_directo(self, fiat, side, countries, pay_types, page_no, publisher_type):
+        from cliente_p2p import RechazoDirecto, MAX_RECHAZOS_SEGUIDOS
+        try:
+            items = self._cliente_http().buscar(fiat, side, countries, pay_types, page_no, publisher_type)
+        except RechazoDirecto as e:
+            with self._lock_stats:
+                self._rechazos_seguidos += 1
+                if self._rechazos_seguidos >= MAX_RECHAZOS_SEGUIDOS and self.http_directo:
+                    print("↩️ Demasiados rechazos seguidos: resto de la corrida por navegador.")
+                    self.http_directo = False
+            print(f"↩️ HTTP directo rechazado ({fiat} {side} p{page_no}): {e}. Se usa el navegador.")
+            return None
+        with self._lock_stats:
+            self._rechazos_seguidos = 0
+            self.directas += 1
+        return items
+
+    def _buscar_navegador(self, fiat, side, countries, pay_types, pages: List[int], publisher_type):
+        self.por_navegador += len(pages)
+        try:
+            return fetch_ui_pages(self.pagina(fiat, side), fiat, side, countries, pay_types, pages, publisher_type)
+        except Exception as e:
+            # Página caída o navegador muerto: se descarta y se reintenta una vez.
+            print(f"⚠️ Reintentando {fiat} {side} p{pages} con página nueva: {e}")
+            self._descartar_pagina(fiat)
+            return fetch_ui_pages(self.pagina(fiat, side), fiat, side, countries, pay_types, pages, publisher_type)
+
+    def buscar(self, fiat: str, side: str, countries: Optional[List[str]],
+               pay_types: Optional[List[str]], page_no: int,
+               publisher_type: Optional[str] = None):
+        key = clave_pagina(fiat, side, countries, pay_types, page_no, publisher_type)
+        if key in self._cache:
+            self.cache_hits += 1
+            return self._cache[key]
+        items = None
+        if self.http_directo:
+            items = self._buscar_directo(fiat, side, countries, pay_types, page_no, publisher_type)
+        if items is None:
+            items = self._buscar_navegador(fiat, side, countries, pay_types, [page_no], publisher_type)[0]
+        self._cache[key] = items
+        return items
+
+    def buscar_paginas(self, fiat: str, side: str, countries: Optional[List[str]],
+                       pay_types: Optional[List[str]], pages: List[int],
+                       publisher_type: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Entrega ``pages`` en orden, pidiendo a lo sumo PAGINAS_EN_VUELO por delante.
+
+        Las páginas ya descargadas en la corrida salen de la caché. Las demás se
+        piden a medida que el llamador avanza (por HTTP en el pool, o por tandas
+        de un solo fetch en el navegador). Al cerrar el generador (ya juntó lo
+        que necesitaba o llegó una página vacía) las páginas siguientes no se
+        piden nunca; las que ya estaban en curso terminan y quedan en la caché.
+        """
+        claves = {n: clave_pagina(fiat, side, countries, pay_types, n, publisher_type) for n in pages}
+        faltan = [n for n in pages if claves[n] not in self._cache]
+        varias = len(faltan) > 1
+        futuros: Dict[int, Any] = {}
+        try:
+            for i, n in enumerate(pages):
+                siguientes = [m for m in pages[i:i + PAGINAS_EN_VUELO]
+                              if m in faltan and m not in futuros and claves[m] not in self._cache]
+                if varias and siguientes and self.http_directo:
+                    self._cliente_http()
+                    pool = self._pool_http()
+                    for m in siguientes:
+                        futuros[m] = pool.submit(self._buscar_directo, fiat, side, countries, pay_types, m, publisher_type)
+                elif varias and n in siguientes:
+                    for m, items in zip(siguientes, self._buscar_navegador(fiat, side, countries, pay_types, siguientes, publisher_type)):
+                        self._cache[claves[m]] = items
+                if n not in faltan:
+                    self.cache_hits += 1
+                elif n in futuros:
+                    items = futuros[n].result()
+                    if items is None:
+                        items = self._buscar_navegador(fiat, side, countries, pay_types, [n], publisher_type)[0]
+                    self._cache[claves[n]] = items
+                elif claves[n] not in self._cache:
+                    self.buscar(fiat, side, countries, pay_types, n, publisher_type)
+                yield self._cache[claves[n]]
+        finally:
+            for fut in futuros.values(): fut.cancel()
+
+    def _descartar_pagina(self, fiat: str):
+        pg = self._paginas.pop(fiat, None)
+        try:
+            if pg is not None: pg.close()
+        except Exception:
+            pass
+
+    def reiniciar_paginas(self):
+        for fiat in list(self._paginas):
+            self._descartar_pagina(fiat)
+        self._cache.clear()
+        # Cada corrida vuelve a intentar el camino directo
+        self.http_directo = self._http_directo_cfg
+        self._rechazos_seguidos = 0
+
+    def _cerrar_browser(self):
+        self._paginas.clear()
+        try:
+            if self._browser is not None: self._browser.close()
+        except Exception:
+            pass
+        self._browser = None
+        self._ctx = None
+
+    def cerrar(self):
+        self._cerrar_browser()
+        try:
+            if self._pw is not None: self._pw.stop()
+        except Exception:
+            pass
+        self._pw = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._http is not None:
+            self._http.cerrar()
+            self._http = None
+
+@contextmanager
+def _sesion_o_temporal(sesion: Optional[SesionNavegador]):
+    if sesion is not None:
+        yield sesion
+        return
+    with SesionNavegador() as tmp:
+        yield tmp
+
+def _clave_anuncio(it: Dict[str, Any]):
+    adv = it.get("adv") or {}
+    return adv.get("advNo") or (adv.get("price"), (it.get("advertiser") or {}).get("nickName"))
 
-        def _try(cset): return fetch_ui_page(pg, fiat, side, cset, None, 1, publisher_type="merchant")
+def _acumular_nuevos(arr: List[Dict[str, Any]], seen: set, collected: List[Dict[str, Any]], need_n: int):
+    for it in arr:
+        key = _clave_anuncio(it)
+        if key in seen: continue
+        seen.add(key)
+        collected.append(it)
+        if len(collected) >= need_n: break
 
-        if fiat == "CLP":
-            items = _try(None)
-            if not items: items = _try(["CL"])
-            if not items and countries is not None: items = _try(countries)
-        else:
-            items = _try(countries)
+def _pasadas_metodo(method_label: str, countries: Optional[List[str]]) -> List[Tuple[Optional[List[str]], Optional[List[str]], bool]]:
+    """(countries, payTypes, filtrar_por_keywords) en el orden en que se prueban."""
+    method_ids = PAYTYPE_IDS.get(method_label, [])
+    country_sets: List[Optional[List[str]]] = [None]
+    if countries: country_sets.append(countries)
+    return [(c, method_ids, False) for c in country_sets] + [(c, None, True) for c in country_sets]
 
-        browser.close()
+def _preparar_pagina_metodo(arr, method_label: str, por_keyword: bool) -> List[Dict[str, Any]]:
+    arr = _filter_tradable(arr)
+    if por_keyword: arr = _items_keyword_filter(arr, PAYTYPE_IDS.get(method_label, []), method_label=method_label)
+    return arr
 
+def _cerrar_first_page(items, side: str) -> List[Dict[str, Any]]:
     items = _filter_tradable(items)
     items = _unique_verified_merchants(items, max_n=50)
-
     if side.upper() == "SELL":
         items = _sort_items_by_price_asc(items)
     return items
 
-def capture_method_page_exact(fiat: str, side: str, method_label: str, page_no: int = 1, need_n: int = 10, countries: Optional[List[str]] = None, merchant_only: bool = False, dedupe_verified: bool = False) -> List[Dict[str, Any]]:
-    method_ids = PAYTYPE_IDS.get(method_label, [])
-    url = page_url(fiat, side)
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        ctx = browser.new_context(locale="es-ES")
-        pg = ctx.new_page()
-        pg.goto(url, wait_until="domcontentloaded")
-        items = fetch_ui_page(pg, fiat, side, countries, method_ids, page_no, publisher_type=("merchant"))
-        browser.close()
-
+def _cerrar_method_exact(items, side: str, need_n: int, dedupe_verified: bool) -> List[Dict[str, Any]]:
     items = _filter_tradable(items)
     if dedupe_verified: items = _unique_verified_merchants(items, need_n)
     else: items = _unique_verified_merchants(items, max_n=50)
-
     if side.upper() == "SELL": items = _sort_items_by_price_asc(items)
     return items[:need_n]
 
-def capture_method_topN_any_page(fiat: str, side: str, method_label: str, countries: Optional[List[str]], need_n: int = TOP_N) -> List[Dict[str, Any]]:
+def _cerrar_topN(collected: List[Dict[str, Any]], side: str, need_n: int) -> List[Dict[str, Any]]:
+    collected = _unique_verified_merchants(collected, need_n)
+    if side.upper() == "SELL": collected = _sort_items_by_price_asc(collected)
+    return collected[:need_n]
+
+# ------- Paginación especulativa -------
+# Media móvil de cuántas páginas necesitó cada pasada, por mercado
+_profundidad: Dict[str, float] = {}
+
+def _cargar_profundidad():
+    if not PROFUNDIDAD_PATH or not os.path.exists(PROFUNDIDAD_PATH): return
+    try:
+        with open(PROFUNDIDAD_PATH, encoding="utf-8") as f:
+            _profundidad.update({k: float(v) for k, v in json.load(f).items()})
+    except Exception as e:
+        print(f"⚠️ No se pudo leer {PROFUNDIDAD_PATH}: {e}")
+
+def guardar_profundidad():
+    if not PROFUNDIDAD_PATH: return
+    try:
+        tmp = PROFUNDIDAD_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_profundidad, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, PROFUNDIDAD_PATH)
+    except Exception as e:
+        print(f"⚠️ No se pudo guardar {PROFUNDIDAD_PATH}: {e}")
+
+def clave_profundidad(fiat: str, side: str, method_label: str, countries: Optional[List[str]], por_keyword: bool) -> str:
+    paises = ",".join(countries) if countries else "*"
+    return f"{fiat}|{side.upper()}|{method_label}|{paises}|{'kw' if por_keyword else 'pt'}"
+
+def ventana_inicial(clave: str) -> int:
+    aprendida = _profundidad.get(clave)
+    if aprendida is None: return VENTANA_PAGINAS
+    return max(1, min(MAX_PAGES_METHOD, math.ceil(aprendida)))
+
+def aprender_profundidad(clave: str, usadas: int):
+    if usadas <= 0: return
+    previa = _profundidad.get(clave)
+    _profundidad[clave] = float(usadas) if previa is None else 0.7 * previa + 0.3 * usadas
+
+def _paginar_pasada(s: "SesionNavegador", fiat: str, side: str, method_label: str,
+                    cset: Optional[List[str]], pay_types: Optional[List[str]], por_keyword: bool,
+                    seen: set, collected: List[Dict[str, Any]], need_n: int):
+    clave = clave_profundidad(fiat, side, method_label, cset, por_keyword)
+    start, ventana, usadas = 1, ventana_inicial(clave), 0
+    while start <= MAX_PAGES_METHOD:
+        paginas = list(range(start, min(start + ventana, MAX_PAGES_METHOD + 1)))
+        lote = s.buscar_paginas(fiat, side, cset, pay_types, paginas, publisher_type="merchant")
+        try:
+            for page_no, arr in zip(paginas, lote):
+                usadas = page_no
+                arr = _preparar_pagina_metodo(arr, method_label, por_keyword)
+                _acumular_nuevos(arr, seen, collected, need_n)
+                if len(collected) >= need_n or not arr:
+                    aprender_profundidad(clave, usadas)
+                    return
+        finally:
+            lote.close()
+        start, ventana = paginas[-1] + 1, VENTANA_PAGINAS
+    aprender_profundidad(clave, usadas)
+
+_cargar_profundidad()
+
+def capture_first_page(fiat: str, side: str, countries: Optional[List[str]], sesion: Optional[SesionNavegador] = None) -> List[Dict[str, Any]]:
+    with _sesion_o_temporal(sesion) as s:
+        def _try(cset): return s.buscar(fiat, side, cset, None, 1, publisher_type="merchant")
+
+        if fiat == "CLP":
+            items = _try(None)
+            if not items: items = _try(["CL"])
+            if not items and countries is not None: items = _try(countries)
+        else:
+            items = _try(countries)
+
+    return _cerrar_first_page(items, side)
+
+def capture_method_page_exact(fiat: str, side: str, method_label: str, page_no: int = 1, need_n: int = 10, countries: Optional[List[str]] = None, merchant_only: bool = False, dedupe_verified: bool = False, sesion: Optional[SesionNavegador] = None) -> List[Dict[str, Any]]:
     method_ids = PAYTYPE_IDS.get(method_label, [])
-    url = page_url(fiat, side)
-    country_sets: List[Optional[List[str]]] = [None]
-    if countries: country_sets.append(countries)
 
+    with _sesion_o_temporal(sesion) as s:
+        items = s.buscar(fiat, side, countries, method_ids, page_no, publisher_type=("merchant"))
+
+    return _cerrar_method_exact(items, side, need_n, dedupe_verified)
+
+def capture_method_topN_any_page(fiat: str, side: str, method_label: str, countries: Optional[List[str]], need_n: int = TOP_N, sesion: Optional[SesionNavegador] = None) -> List[Dict[str, Any]]:
     collected: List[Dict[str, Any]] = []
     seen_advnos = set()
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        ctx = browser.new_context(locale="es-ES")
-        pg = ctx.new_page()
-        pg.goto(url, wait_until="domcontentloaded")
-
-        for cset in country_sets:
-            for page_no in range(1, MAX_PAGES_METHOD + 1):
-                arr = fetch_ui_page(pg, fiat, side, cset, method_ids, page_no, publisher_type="merchant")
-                arr = _filter_tradable(arr)
-                for it in arr:
-                    adv = it.get("adv") or {}
-                    advno = adv.get("advNo") or (adv.get("price"), (it.get("advertiser") or {}).get("nickName"))
-                    if advno in seen_advnos: continue
-                    seen_advnos.add(advno)
-                    collected.append(it)
-                    if len(collected) >= need_n: break
-                if len(collected) >= need_n or not arr: break
+    with _sesion_o_temporal(sesion) as s:
+        for cset, pay_types, por_keyword in _pasadas_metodo(method_label, countries):
+            _paginar_pasada(s, fiat, side, method_label, cset, pay_types, por_keyword, seen_advnos, collected, need_n)
             if len(collected) >= need_n: break
 
-        if len(collected) < need_n:
-            for cset in country_sets:
-                for page_no in range(1, MAX_PAGES_METHOD + 1):
-                    arr = fetch_ui_page(pg, fiat, side, cset, None, page_no, publisher_type="merchant")
-                    arr = _filter_tradable(arr)
-                    arr = _items_keyword_filter(arr, method_ids, method_label=method_label)
-                    for it in arr:
-                        adv = it.get("adv") or {}
-                        advno = adv.get("advNo") or (adv.get("price"), (it.get("advertiser") or {}).get("nickName"))
-                        if advno in seen_advnos: continue
-                        seen_advnos.add(advno)
-                        collected.append(it)
-                        if len(collected) >= need_n: break
-                    if len(collected) >= need_n or not arr: break
-                if len(collected) >= need_n: break
-
-        browser.close()
-
-    collected = _unique_verified_merchants(collected, need_n)
-    if side.upper() == "SELL": collected = _sort_items_by_price_asc(collected)
-    return collected[:need_n]
+    return _cerrar_topN(collected, side, need_n)
 
 def topN_from_items(items: List[Dict[str, Any]], n: int) -> List[Dict[str, Any]]:
     out = []
@@ -394,7 +692,219 @@ def print_block(label: str, fiat: str, side: str, offers: List[Dict[str, Any]]):
         print(f"[{i:02d}] precio={o['price']} | vendedor={o['seller']} | métodos={ms}")
 
 # ------- Supabase -------
+# Persistencia en lote: filas por insert y reintentos por lote
+LOTE_TAMANO = int(os.getenv("TASAS_LOTE_TAMANO", "500"))
+LOTE_REINTENTOS = int(os.getenv("TASAS_LOTE_REINTENTOS", "3"))
+# Último valor por nombre_tasa (ver sql/tasas_actuales.sql)
+TABLA_ACTUALES = "tasas_actuales"
+# Una fila por corrida terminada; los bots la escuchan en vivo (ver sql/tasas_corridas.sql)
+TABLA_CORRIDAS = "tasas_corridas"
+
+def nuevo_run_id() -> str:
+    return (datetime.utcnow() - timedelta(hours=4)).strftime("%Y%m%dT%H%M%S")
+
+class BufferTasas:
+    """Junta las tasas de una corrida y las escribe en inserts masivos."""
+
+    def __init__(self, run_id: Optional[str] = None, tam_lote: int = LOTE_TAMANO, reintentos: int = LOTE_REINTENTOS):
+        self.run_id = run_id or nuevo_run_id()
+        self.tam_lote = max(1, tam_lote)
+        self.reintentos = max(1, reintentos)
+        self.filas: List[Dict[str, Any]] = []
+        self._ultimo: Dict[str, float] = {}
+        self.ultimas_escritas: Dict[str, Dict[str, Any]] = {}
+
+    def agregar(self, nombre: str, valor: float, decimales: int = 4) -> Dict[str, Any]:
+        fecha_ve = datetime.utcnow() - timedelta(hours=4)
+        fila = {
+            "nombre_tasa": nombre,
+            "valor": round(float(valor), decimales),
+            "fecha_actual": fecha_ve.isoformat()
+        }
+        self.filas.append(fila)
+        self._ultimo[nombre] = fila["valor"]
+        return fila
+
+    def pendiente(self, nombre: str) -> Optional[float]:
+        """Último valor en cola para ``nombre`` (aún no está en la base)."""
+        return self._ultimo.get(nombre)
+
+    def _con_reintentos(self, etiqueta: str, escribir) -> bool:
+        for intento in range(1, self.reintentos + 1):
+            try:
+                res = escribir()
+                if getattr(res, "data", None): return True
+                print(f"⚠️ {etiqueta}: respuesta vacía (intento {intento}/{self.reintentos}).")
+            except Exception as e:
+                print(f"⚠️ {etiqueta}: {e} (intento {intento}/{self.reintentos}).")
+            if intento < self.reintentos: time.sleep(2 ** (intento - 1))
+        return False
+
+    def _insertar_lote(self, lote: List[Dict[str, Any]], n_lote: int) -> bool:
+        return self._con_reintentos(f"Lote {n_lote}", lambda: supabase.table("tasas").insert(lote).execute())
+
+    def _actualizar_actuales(self, escritas: List[Dict[str, Any]]) -> int:
+        """Upsert de la última fila escrita de cada nombre en TABLA_ACTUALES."""
+        ultimas: Dict[str, Dict[str, Any]] = {}
+        for fila in escritas:
+            ultimas[fila["nombre_tasa"]] = {**fila, "run_id": self.run_id}
+        filas = list(ultimas.values())
+        ok = 0
+        for i in range(0, len(filas), self.tam_lote):
+            lote = filas[i:i + self.tam_lote]
+            if self._con_reintentos(f"{TABLA_ACTUALES} lote {i // self.tam_lote + 1}",
+                                    lambda: supabase.table(TABLA_ACTUALES).upsert(lote, on_conflict="nombre_tasa").execute()):
+                ok += len(lote)
+        return ok
+
+    def _registrar_corrida(self, resumen: Dict[str, int]) -> bool:
+        fila = {
+            "run_id": self.run_id,
+            "fecha_fin": (datetime.utcnow() - timedelta(hours=4)).isoformat(),
+            "escritas": resumen["escritas"],
+            "actuales": resumen["actuales"],
+        }
+        return self._con_reintentos(TABLA_CORRIDAS, lambda: supabase.table(TABLA_CORRIDAS).insert(fila).execute())
+
+    def vaciar(self) -> Dict[str, int]:
+        filas, self.filas = self.filas, []
+        resumen = {"filas": len(filas), "escritas": 0, "lotes": 0, "fallidos": 0, "actuales": 0}
+        escritas: List[Dict[str, Any]] = []
+        for i in range(0, len(filas), self.tam_lote):
+            lote = filas[i:i + self.tam_lote]
+            resumen["lotes"] += 1
+            if self._insertar_lote(lote, resumen["lotes"]): escritas.extend(lote)
+            else:
+                resumen["fallidos"] += 1
+                print(f"❌ Lote {resumen['lotes']} descartado: {len(lote)} tasas sin guardar.")
+        resumen["escritas"] = len(escritas)
+        for fila in escritas: self.ultimas_escritas[fila["nombre_tasa"]] = fila
+        if escritas:
+            resumen["actuales"] = self._actualizar_actuales(escritas)
+            self._registrar_corrida(resumen)
+        self._ultimo.clear()
+        print(f"💾 Tasas escritas: {resumen['escritas']}/{resumen['filas']} en {resumen['lotes']} lotes"
+              + (f" ({resumen['fallidos']} fallidos)" if resumen["fallidos"] else "")
+              + f" | {TABLA_ACTUALES}: {resumen['actuales']} (run {self.run_id}).")
+        return resumen
+
+def _parse_fecha(v: str) -> datetime:
+    # Se escriben como hora VE sin zona; si la columna es timestamptz vuelve con +00:00
+    return isoparse(str(v)).replace(tzinfo=None)
+
+class EstadoPromedios:
+    """Últimos valores por nombre de tasa, para calcular los promedios sin ir a la base."""
+
+    def __init__(self, modo: str = PROMEDIO_MODO, ventana: int = PROMEDIO_VENTANA,
+                 vida_media_h: float = PROMEDIO_VIDA_MEDIA_H):
+        if modo not in ("ultimos", "ponderado"):
+            raise ValueError(f"PROMEDIO_MODO inválido: {modo!r}")
+        self.modo = modo
+        self.ventana = max(2, ventana)
+        self.vida_media_h = vida_media_h
+        self.series: Dict[str, deque] = {}
+
+    def registrar(self, nombre: str, valor: float, fecha: Optional[datetime] = None):
+        serie = self.series.setdefault(nombre, deque(maxlen=self.ventana))
+        serie.append((fecha or datetime.utcnow() - timedelta(hours=4), Decimal(str(valor))))
+
+    def cargar(self, nombres: Set[str], historia_h: float = PROMEDIO_HISTORIA_H, tam_pagina: int = 1000):
+        """Carga la historia reciente de ``nombres`` con una sola consulta paginada."""
+        faltan = self.ventana - 1
+        desde = (datetime.utcnow() - timedelta(hours=4 + historia_h)).isoformat()
+        previos: Dict[str, List[Tuple[datetime, Decimal]]] = {}
+        completos, filas = 0, 0
+        filtros = lambda q: q.like("nombre_tasa", "Tasa %").not_.like("nombre_tasa", "%promedio%")
+        for r in iterar_tasas(supabase, desde=desde, filtros=filtros, tam_pagina=tam_pagina):
+            filas += 1
+            n = r.get("nombre_tasa")
+            if n not in nombres: continue
+            vals = previos.setdefault(n, [])
+            if len(vals) >= faltan: continue
+            vals.append((_parse_fecha(r["fecha_actual"]), Decimal(str(r["valor"]))))
+            if len(vals) == faltan:
+                completos += 1
+                if completos == len(nombres): break
+        for n, vals in previos.items():
+            for fecha, valor in reversed(vals):
+                self.series.setdefault(n, deque(maxlen=self.ventana)).append((fecha, valor))
+        print(f"📚 Historia para promedios: {filas} filas, {len(previos)}/{len(nombres)} tasas con datos.")
+
+    def promedio(self, nombre: str) -> Optional[float]:
+        serie = self.series.get(nombre)
+        if not serie or len(serie) < 2: return None
+        if self.modo == "ultimos":
+            return float(sum(v for _, v in serie) / len(serie))
+        ultima = serie[-1][0]
+        pesos = [Decimal(str(0.5 ** (((ultima - f).total_seconds() / 3600) / self.vida_media_h))) for f, _ in serie]
+        return float(sum(p * v for p, (_, v) in zip(pesos, serie)) / sum(pesos))
+
+TIPOS_TASA = ("full", "público", "promocional", "mayorista")
+
+def nombres_promediados() -> Set[str]:
+    """Tasas de las que la corrida guarda un promedio."""
+    out = {"Tasa full COP USDT", "Tasa mayorista COP USDT"}
+    for o in {c["label"] for c in BUY_CONFIGS}:
+        for d in {c["label"] for c in SELL_CONFIGS}:
+            if o == d: continue
+            out.update(f"Tasa {t} {o} - {d}" for t in TIPOS_TASA)
+    return out
+
+_buffer_activo: Optional[BufferTasas] = None
+_estado_promedios: Optional[EstadoPromedios] = None
+
+@contextmanager
+def escritura_en_lote(run_id: Optional[str] = None):
+    """Mientras está activo, guardar_tasa encola en lugar de insertar fila por fila."""
+    global _buffer_activo
+    buf = BufferTasas(run_id)
+    _buffer_activo = buf
+    try:
+        yield buf
+    finally:
+        _buffer_activo = None
+        buf.vaciar()
+
+def publicar_snapshot_corrida(buf: BufferTasas):
+    """Publica el snapshot compartido: lo escrito en esta corrida sobre lo de hoy del snapshot anterior.
+
+    Del snapshot anterior solo se conservan las tasas del mismo día; una tasa
+    que se deja de capturar sale del archivo al cambiar el día.
+    """
+    if not SNAPSHOT_PATH or not buf.ultimas_escritas: return
+    try:
+        dia = max(f["fecha_actual"] for f in buf.ultimas_escritas.values())[:10]
+        tasas = {n: v for n, v in leer_snapshot().items() if v[1].startswith(dia)}
+        tasas.update({n: (f["valor"], f["fecha_actual"]) for n, f in buf.ultimas_escritas.items()})
+        version = publicar_snapshot(tasas, {"run_id": buf.run_id, "dia": dia})
+        print(f"🗂️ Snapshot de tasas publicado: {len(tasas)} tasas (versión {version}).")
+    except Exception as e:
+        print(f"⚠️ No se pudo publicar el snapshot de tasas: {e}")
+
+@contextmanager
+def promedios_en_memoria(nombres: Optional[Set[str]] = None):
+    """Carga la historia una vez y resuelve promedio_tasa en memoria durante la corrida."""
+    global _estado_promedios
+    estado = EstadoPromedios()
+    try:
+        estado.cargar(nombres if nombres is not None else nombres_promediados())
+    except Exception as e:
+        print(f"⚠️ No se pudo cargar la historia de promedios, se consulta tasa por tasa: {e}")
+        yield None
+        return
+    _estado_promedios = estado
+    try:
+        yield estado
+    finally:
+        _estado_promedios = None
+
 def guardar_tasa(nombre: str, valor: float, decimales: int = 4):
+    if _estado_promedios is not None and "promedio" not in nombre:
+        _estado_promedios.registrar(nombre, round(float(valor), decimales))
+    if _buffer_activo is not None:
+        fila = _buffer_activo.agregar(nombre, valor, decimales)
+        print(f"📝 Tasa en cola: {nombre} = {fila['valor']}")
+        return
     try:
         fecha_ve = datetime.utcnow() - timedelta(hours=4)
         res = supabase.table("tasas").insert({
@@ -407,9 +917,15 @@ def guardar_tasa(nombre: str, valor: float, decimales: int = 4):
     except Exception as e: print(f"❌ Excepción al guardar {nombre}: {e}")
 
 def promedio_tasa(nombre: str) -> Optional[float]:
+    if _estado_promedios is not None:
+        return _estado_promedios.promedio(nombre)
     try:
-        resp = supabase.table("tasas").select("valor").eq("nombre_tasa", nombre).order("fecha_actual", desc=True).limit(2).execute()
+        # Con escritura en lote el valor recién calculado todavía no está en la base
+        en_cola = _buffer_activo.pendiente(nombre) if _buffer_activo is not None else None
+        limite = 1 if en_cola is not None else 2
+        resp = supabase.table("tasas").select("valor").eq("nombre_tasa", nombre).order("fecha_actual", desc=True).limit(limite).execute()
         vals = [Decimal(r["valor"]) for r in (resp.data or [])]
+        if en_cola is not None: vals.insert(0, Decimal(str(en_cola)))
         if len(vals) == 2: return float((vals[0] + vals[1]) / 2)
     except Exception as e: print(f"⚠️ promedio_tasa error para {nombre}: {e}")
     return None
@@ -423,25 +939,37 @@ def limpieza_automatica_tasas():
         print(f"⚠️ Alerta: No se pudo limpiar la base de datos de tasas: {e}")
 
 # ------- Orquestación -------
-def tomar_base_y_guardar(label: str, fiat: str, side: str, method: Optional[str], countries: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+def _es_zelle_usd(fiat: str, method: Optional[str]) -> bool:
+    return method == "Zelle" and fiat == "USD"
+
+def parametros_mercado(label: str, side_u: str) -> Tuple[int, int]:
+    """(índice base 1-based, cuántas ofertas pedir) para un mercado."""
+    if side_u == "SELL": return 1, 10
+    base_idx = BASE_INDEX_BY_MARKET.get((label, side_u), TOP_N)
+    return base_idx, base_idx
+
+def capturar_items(label: str, fiat: str, side: str, method: Optional[str], countries: Optional[List[str]], sesion: Optional[SesionNavegador] = None) -> List[Dict[str, Any]]:
     side_u = side.upper()
+    _, need_n = parametros_mercado(label, side_u)
 
-    if side_u == "SELL": base_idx, need_n = 1, 10
-    else:
-        base_idx = BASE_INDEX_BY_MARKET.get((label, side_u), TOP_N)
-        need_n = base_idx
+    if _es_zelle_usd(fiat, method):
+        return capture_method_page_exact(fiat=f"{fiat}", side=side_u, method_label="Zelle", page_no=1, need_n=10, countries=None, merchant_only=True, dedupe_verified=True, sesion=sesion)
+    if method: return capture_method_topN_any_page(fiat, side_u, method, countries, need_n=need_n, sesion=sesion)
+    return capture_first_page(fiat, side_u, countries, sesion=sesion)
 
-    if method == "Zelle" and fiat == "USD":
-        items = capture_method_page_exact(fiat=f"{fiat}", side=side_u, method_label="Zelle", page_no=1, need_n=10, countries=None, merchant_only=True, dedupe_verified=True)
-    else:
-        if method: items = capture_method_topN_any_page(fiat, side_u, method, countries, need_n=need_n)
-        else: items = capture_first_page(fiat, side_u, countries)
+def tomar_base_y_guardar(label: str, fiat: str, side: str, method: Optional[str], countries: Optional[List[str]], sesion: Optional[SesionNavegador] = None) -> Optional[Dict[str, Any]]:
+    items = capturar_items(label, fiat, side, method, countries, sesion=sesion)
+    return procesar_base_y_guardar(label, fiat, side, method, items)
+
+def procesar_base_y_guardar(label: str, fiat: str, side: str, method: Optional[str], items: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    side_u = side.upper()
+    base_idx, need_n = parametros_mercado(label, side_u)
 
-    offers = topN_from_items(items, 10 if (method == "Zelle" and fiat == "USD") else need_n)
+    offers = topN_from_items(items, 10 if _es_zelle_usd(fiat, method) else need_n)
     print_block(label, fiat, side_u, offers)
     if not offers: return None
 
-    if method == "Zelle" and fiat == "USD":
+    if _es_zelle_usd(fiat, method):
         if side_u == "SELL": base = min(offers, key=lambda o: (o["price"] if o["price"] is not None else float("inf")))
         else: base = max(offers, key=lambda o: (o["price"] if o["price"] is not None else -float("inf")))
     else:
@@ -478,44 +1006,32 @@ def tomar_base_y_guardar(label: str, fiat: str, side: str, method: Optional[str]
     return {"price": float(precio_base), "seller": vendedor, "methods": metodos, "fiat": fiat}
 
 def calcular_pares(precios_buy: Dict[str, Dict[str, Any]], precios_sell: Dict[str, Dict[str, Any]]):
-    for origen, odata in precios_buy.items():
-        for destino, ddata in precios_sell.items():
+    origenes, destinos = list(precios_buy), list(precios_sell)
+    if not origenes or not destinos: return
+    mp = matriz_para(origenes, destinos, lambda b: margenes_personalizados.get(b, margen_por_defecto(b)),
+                     pares_sumar_margen, decimales_base)
+    r = mp.calcular(np.array([precios_buy[o]["price"] for o in origenes]),
+                    np.array([precios_sell[d]["price"] for d in destinos]))
+
+    for i, origen in enumerate(origenes):
+        for j, destino in enumerate(destinos):
             if origen == destino: continue
             base = f"{origen} - {destino}"
-            p_origen = odata["price"]
-            p_dest   = ddata["price"]
-
-            if destino == "USA":
-                tasa_full = p_dest / p_origen
-                decimales = 6
-                margen = margenes_personalizados.get(base, margen_por_defecto(base))
-                tasa_publico   = tasa_full * (1 - margen["publico"])
-                tasa_mayorista = tasa_full * (1 - margen["mayorista"])
-            else:
-                if base in pares_sumar_margen: tasa_full = p_origen / p_dest
-                else: tasa_full = p_dest / p_origen
-                decimales = decimales_auto(tasa_full, origen, destino)
-                margen = margenes_personalizados.get(base, margen_por_defecto(base))
-                if base in pares_sumar_margen:
-                    tasa_publico   = tasa_full * (1 + margen["publico"])
-                    tasa_mayorista = tasa_full * (1 + margen["mayorista"])
-                else:
-                    tasa_publico   = tasa_full * (1 - margen["publico"])
-                    tasa_mayorista = tasa_full * (1 - margen["mayorista"])
-
-            # ---> CÁLCULO DE TASA PROMOCIONAL <---
-            tasa_promocional = (tasa_publico + tasa_mayorista) / 2
-
-            guardar_tasa(f"Tasa full {base}", tasa_full, decimales)
-            guardar_tasa(f"Tasa público {base}", tasa_publico, decimales)
-            guardar_tasa(f"Tasa promocional {base}", tasa_promocional, decimales)
-            guardar_tasa(f"Tasa mayorista {base}", tasa_mayorista, decimales)
+            if not r["valido"][i, j]:
+                print(f"⚠️ Tasas {base} omitidas: precio inválido.")
+                continue
+            decimales = int(r["decimales"][i, j])
+
+            guardar_tasa(f"Tasa full {base}", float(r["full"][i, j]), decimales)
+            guardar_tasa(f"Tasa público {base}", float(r["publico"][i, j]), decimales)
+            guardar_tasa(f"Tasa promocional {base}", float(r["promocional"][i, j]), decimales)
+            guardar_tasa(f"Tasa mayorista {base}", float(r["mayorista"][i, j]), decimales)
 
             pf = promedio_tasa(f"Tasa full {base}")
             pp = promedio_tasa(f"Tasa público {base}")
             ppromo = promedio_tasa(f"Tasa promocional {base}")
             pm = promedio_tasa(f"Tasa mayorista {base}")
-            
+
             if pf is not None: guardar_tasa(f"Tasa full promedio {base}", pf, decimales)
             if pp is not None: guardar_tasa(f"Tasa público promedio {base}", pp, decimales)
             if ppromo is not None: guardar_tasa(f"Tasa promocional promedio {base}", ppromo, decimales)
@@ -523,25 +1039,97 @@ def calcular_pares(precios_buy: Dict[str, Dict[str, Any]], precios_sell: Dict[st
 
             print(f"✅ Tasas {base} (incluyendo Promocional) actualizadas.")
 
-def main():
+def _rss_pico_mb() -> Tuple[Optional[float], Optional[float]]:
+    """RSS pico (MB) del proceso y del mayor hijo terminado (Chromium)."""
+    if resource is None: return None, None
+    propio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return propio, hijos
+
+def _reportar_corrida(t0: float, stats: Dict[str, int]):
+    propio, hijos = _rss_pico_mb()
+    rss = "n/d" if propio is None else f"{propio:.0f} MB proceso / {hijos:.0f} MB hijo"
+    print(f"⏱️ Corrida: {time.perf_counter() - t0:.1f}s | arranques de Chromium: {stats.get('lanzamientos', 0)} "
+          f"| peticiones directas/navegador/caché: {stats.get('directas', 0)}/{stats.get('navegador', 0)}/{stats.get('cache', 0)} "
+          f"| RSS pico: {rss}")
+
+def _mercados_de_la_corrida() -> List[Tuple[str, str, str, Optional[str], Optional[List[str]]]]:
+    return (
+        [(c["label"], c["fiat"], "BUY", c.get("method"), c.get("countries")) for c in BUY_CONFIGS] +
+        [(c["label"], c["fiat"], "SELL", c.get("method"), c.get("countries")) for c in SELL_CONFIGS]
+    )
+
+def _capturar_secuencial(mercados, sesion: Optional[SesionNavegador]) -> Tuple[List[Optional[List[Dict[str, Any]]]], Dict[str, int]]:
+    propia = sesion is None
+    if propia: sesion = SesionNavegador()
+    previas = sesion.estadisticas()
+    resultados: List[Optional[List[Dict[str, Any]]]] = []
+    try:
+        for label, fiat, side, method, countries in mercados:
+            try:
+                resultados.append(capturar_items(label, fiat, side, method, countries, sesion=sesion))
+            except Exception as e:
+                print(f"❌ {label} {fiat} {side}: error en captura: {e}")
+                resultados.append(None)
+    finally:
+        if propia: sesion.cerrar()
+        else: sesion.reiniciar_paginas()
+    return resultados, {k: v - previas[k] for k, v in sesion.estadisticas().items()}
+
+def main(sesion: Optional[SesionNavegador] = None):
     print("\n🔁 Ejecutando actualización…")
+    t0 = time.perf_counter()
     precios_buy: Dict[str, Dict[str, Any]] = {}
     precios_sell: Dict[str, Dict[str, Any]] = {}
 
-    for cfg in BUY_CONFIGS:
-        res = tomar_base_y_guardar(cfg["label"], cfg["fiat"], "BUY", cfg.get("method"), cfg.get("countries"))
-        if res: precios_buy[cfg["label"]] = res
-
-    for cfg in SELL_CONFIGS:
-        res = tomar_base_y_guardar(cfg["label"], cfg["fiat"], "SELL", cfg.get("method"), cfg.get("countries"))
-        if res: precios_sell[cfg["label"]] = res
-
-    calcular_pares(precios_buy, precios_sell)
+    mercados = _mercados_de_la_corrida()
+    if CAPTURA_CONCURRENTE and sesion is None:
+        from captura_async import capturar_todos
+        capturas, stats = capturar_todos(mercados)
+    else:
+        capturas, stats = _capturar_secuencial(mercados, sesion)
+    guardar_profundidad()
+
+    with escritura_en_lote() as buf, promedios_en_memoria():
+        # El guardado sigue el orden de BUY_CONFIGS/SELL_CONFIGS sin importar cuándo terminó cada captura
+        for (label, fiat, side, method, _), items in zip(mercados, capturas):
+            res = procesar_base_y_guardar(label, fiat, side, method, items or [])
+            if not res: continue
+            if side == "BUY": precios_buy[label] = res
+            else: precios_sell[label] = res
+
+        calcular_pares(precios_buy, precios_sell)
+    publicar_snapshot_corrida(buf)
     limpieza_automatica_tasas()
+    _reportar_corrida(t0, stats)
     print("\n✅ Proceso finalizado.")
 
-def actualizar_todas_las_tasas():
-    return main()
+@contextmanager
+def candado_corrida(path: str = CORRIDA_LOCK_PATH) -> Iterator[bool]:
+    """True si esta corrida tomó el candado; False si otro proceso ya está corriendo."""
+    if fcntl is None or not path:
+        yield True
+        return
+    with open(path, "a+") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            f.truncate(0)
+            f.write(f"{os.getpid()}\n")
+            f.flush()
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def actualizar_todas_las_tasas(sesion: Optional[SesionNavegador] = None):
+    with candado_corrida() as propio:
+        if not propio:
+            print(f"⏭️ Ya hay una corrida de tasas activa (candado {CORRIDA_LOCK_PATH}); se omite esta.")
+            return None
+        return main(sesion)
 
 margenes_personalizados.update({
     "USA - Chile":     {"publico": 0.10, "mayorista": 0.07},
@@ -565,4 +1153,4 @@ margenes_personalizados.update({
 })
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    actualizar_todas_las_tasas()
\ No newline at end of file
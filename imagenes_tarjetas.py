@@ -0,0 +1,149 @@
+"""Tarjetas de tasas como imagen PNG (Pillow).
+
+Después de cada corrida un hilo de fondo renderiza todas las tarjetas
+(par × nivel) y las guarda por (run_id, generación, par, nivel). La primera
+vez que se envía una, Telegram devuelve un file_id; desde ahí se reenvía ese
+id sin volver a subir ni a renderizar la imagen. La generación de la caché
+entra en la clave porque en tiempo real las tarjetas cambian fila a fila sin
+que cambie el run_id.
+
+Se activa con TARJETAS_IMAGEN=1; si algo falla, el bot manda el texto.
+"""
+import io
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from tarjetas_tasas import TarjetasTasas, clave_par
+
+IMAGENES_ACTIVAS = os.getenv("TARJETAS_IMAGEN", "0") == "1"
+FUENTE = os.getenv("TARJETAS_FUENTE", "DejaVuSans.ttf")
+FUENTE_NEGRITA = os.getenv("TARJETAS_FUENTE_NEGRITA", "DejaVuSans-Bold.ttf")
+
+ANCHO = 720
+MARGEN = 36
+TAM_TITULO = 34
+TAM_TEXTO = 26
+INTERLINEA = 14
+FONDO = (18, 24, 38)
+PANEL = (28, 36, 56)
+COLOR_TITULO = (255, 255, 255)
+COLOR_TEXTO = (214, 222, 235)
+COLOR_VALOR = (120, 220, 160)
+COLOR_PIE = (150, 160, 180)
+
+# Emojis y dibujo de cajas no salen en las fuentes normales: se quitan del texto
+_NO_DIBUJABLE = re.compile("[\u2500-\u257f\u2600-\u27bf\ufe0f\u200d\U0001f000-\U0001faff]")
+
+def _fuente(nombre: str, tam: int):
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype(nombre, tam)
+    except OSError:
+        return ImageFont.load_default(size=tam)
+
+def _lineas(texto: str):
+    out = []
+    for l in texto.splitlines():
+        l = " ".join(_NO_DIBUJABLE.sub("", l).split())
+        if l: out.append(l)
+    return out
+
+def renderizar_png(texto: str) -> bytes:
+    """PNG de una tarjeta: primera línea como título, la última (hora) como pie."""
+    from PIL import Image, ImageDraw
+
+    lineas = _lineas(texto)
+    titulo, cuerpo, pie = lineas[0], lineas[1:-1], lineas[-1] if len(lineas) > 1 else ""
+    f_titulo, f_texto = _fuente(FUENTE_NEGRITA, TAM_TITULO), _fuente(FUENTE, TAM_TEXTO)
+    alto_linea = TAM_TEXTO + INTERLINEA
+    alto = MARGEN * 3 + TAM_TITULO + INTERLINEA + alto_linea * len(cuerpo) + TAM_TEXTO
+
+    img = Image.new("RGB", (ANCHO, alto), FONDO)
+    d = ImageDraw.Draw(img)
+    y = MARGEN
+    d.text((MARGEN, y), titulo, font=f_titulo, fill=COLOR_TITULO)
+    y += TAM_TITULO + INTERLINEA + MARGEN // 2
+    d.rounded_rectangle((MARGEN // 2, y - INTERLINEA, ANCHO - MARGEN // 2, y + alto_linea * len(cuerpo) + INTERLINEA // 2),
+                        radius=16, fill=PANEL)
+    for l in cuerpo:
+        etiqueta, sep, valor = l.partition(": ")
+        d.text((MARGEN, y), etiqueta + sep, font=f_texto, fill=COLOR_TEXTO)
+        if valor:
+            ancho_valor = d.textlength(valor, font=f_texto)
+            d.text((ANCHO - MARGEN - ancho_valor, y), valor, font=f_texto, fill=COLOR_VALOR)
+        y += alto_linea
+    d.text((MARGEN, y + MARGEN // 2), pie, font=f_texto, fill=COLOR_PIE)
+
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+Clave = Tuple[Optional[str], int, str, str]  # (run_id, generación, par, nivel)
+
+class ImagenesTarjetas:
+    def __init__(self, tarjetas: TarjetasTasas, bot):
+        self.tarjetas = tarjetas
+        self.bot = bot
+        self.png: Dict[Clave, bytes] = {}
+        self.file_ids: Dict[Clave, str] = {}
+        self._generacion_ids: Optional[int] = None  # generación de los file_id guardados
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="imagenes-tarjetas")
+        self.renderizadas = 0
+        self.subidas = 0
+        self.reenvios = 0
+
+    def _clave(self, par: str, nivel: str) -> Clave:
+        cache = self.tarjetas.cache
+        return (cache.run_id, cache.generacion, clave_par(par), nivel)
+
+    def _renderizar_todas(self):
+        try:
+            self.tarjetas.asegurar()
+            run_id, generacion = self.tarjetas.cache.run_id, self.tarjetas.cache.generacion
+            nuevas: Dict[Clave, bytes] = {}
+            for (clave, nivel), texto in list(self.tarjetas.tarjetas.items()):
+                if texto.startswith("❌"): continue
+                nuevas[(run_id, generacion, clave, nivel)] = renderizar_png(texto)
+            with self._lock:
+                # Solo queda lo de la generación actual
+                self.png = nuevas
+                self.file_ids = {k: v for k, v in self.file_ids.items() if k in nuevas}
+                self._generacion_ids = generacion
+            self.renderizadas += len(nuevas)
+            print(f"🖼️ Tarjetas PNG listas: {len(nuevas)} (run {self.tarjetas.cache.run_id}).")
+        except Exception as e:
+            print(f"⚠️ No se pudieron renderizar las tarjetas PNG: {e}")
+
+    def programar(self):
+        """Encola el renderizado de todas las tarjetas de la corrida actual."""
+        self._pool.submit(self._renderizar_todas)
+
+    def enviar(self, chat_id: int, par: str, nivel: str) -> bool:
+        """Manda la tarjeta como foto; False si no corresponde (sin datos) o falló."""
+        # La clave antes que el texto: si la caché avanza entre medio, la imagen nueva
+        # queda bajo una generación vieja que ya nadie pide, nunca al revés
+        clave = self._clave(par, nivel)
+        texto = self.tarjetas.obtener(par, nivel)
+        if texto.startswith("❌"): return False
+        try:
+            file_id = self.file_ids.get(clave)
+            if file_id is not None:
+                self.bot.send_photo(chat_id, file_id)
+                self.reenvios += 1
+                return True
+            png = self.png.get(clave) or renderizar_png(texto)
+            msg = self.bot.send_photo(chat_id, png)
+            self.subidas += 1
+            if msg and msg.photo:
+                with self._lock:
+                    if self._generacion_ids != clave[1]:
+                        self.file_ids, self._generacion_ids = {}, clave[1]
+                    self.file_ids[clave] = msg.photo[-1].file_id
+            return True
+        except Exception as e:
+            print(f"⚠️ No se pudo enviar la tarjeta PNG de {par}: {e}")
+            return False
@@ -0,0 +1,408 @@
+"""Lectura de tasas para los bots.
+
+Lo de hoy sale de la función ``tasas_ultimas_del_dia`` (DISTINCT ON en el
+servidor, ver sql/tasas_ultimas_del_dia.sql); los últimos valores de
+``tasas_actuales`` (sql/tasas_actuales.sql) y, en último caso, la historia de
+``tasas`` quedan como respaldo mientras esas piezas no estén desplegadas.
+Si el bot corre en la misma máquina que la corrida, el snapshot por mmap
+(snapshot_tasas.py) evita la red por completo.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Callable
+
+from dateutil import parser
+
+from snapshot_tasas import LectorSnapshot, SNAPSHOT_PATH
+from vuelo_unico import VueloUnico, VueloUnicoAsync
+
+TABLA_ACTUALES = "tasas_actuales"
+TABLA_HISTORIA = "tasas"
+RPC_ULTIMAS_DEL_DIA = "tasas_ultimas_del_dia"
+
+# Recarga completa como máximo cada TTL; entre medio, sondeo barato de run_id
+CACHE_TTL_S = float(os.getenv("TASAS_CACHE_TTL_S", "600"))
+CACHE_SONDEO_S = float(os.getenv("TASAS_CACHE_SONDEO_S", "30"))
+
+NOMBRES_COP_USDT = (
+    "tasa full cop usdt", "tasa mayorista cop usdt",
+    "tasa público cop usdt", "tasa público promedio cop usdt",
+    "tasa mayorista promedio cop usdt", "tasa full promedio cop usdt",
+)
+
+def hoy_iso_ve() -> str:
+    return (datetime.utcnow() - timedelta(hours=4)).date().isoformat()
+
+COLUMNAS_ACTUALES = "nombre_tasa, valor, fecha_actual, run_id"
+TAM_PAGINA = 1000  # max-rows por defecto de PostgREST
+
+def leer_tasas_actuales(client, nombres: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """Filas (nombre_tasa, valor, fecha_actual, run_id) de la tabla de últimos valores, paginadas."""
+    filtros = None
+    if nombres is not None:
+        lista = list(nombres)
+        filtros = lambda q: q.in_("nombre_tasa", lista)
+    return list(iterar_tasas(client, columnas=COLUMNAS_ACTUALES, filtros=filtros, tabla=TABLA_ACTUALES))
+
+def _pagina_tasas(client, tabla: str, columnas: str, filtros: Optional[Callable[[Any], Any]],
+                  desde: Optional[str], cursor: Optional[str], en_cursor: int, tam_pagina: int):
+    """Query de una página del keyset (fecha_actual desc, nombre_tasa), sin ejecutar."""
+    q = client.table(tabla).select(columnas)
+    if filtros is not None: q = filtros(q)
+    if desde is not None: q = q.gte("fecha_actual", desde)
+    if cursor is not None: q = q.lte("fecha_actual", cursor)
+    q = q.order("fecha_actual", desc=True).order("nombre_tasa")
+    return q.range(en_cursor, en_cursor + tam_pagina - 1)
+
+def _avanzar_cursor(data: List[Dict[str, Any]], cursor: Optional[str], en_cursor: int) -> Tuple[str, int]:
+    ultima = data[-1]["fecha_actual"]
+    iguales = sum(1 for r in data if r["fecha_actual"] == ultima)
+    # Si la página entera es del mismo instante, se sigue saltando dentro de él
+    return ultima, (en_cursor + iguales if ultima == cursor else iguales)
+
+def iterar_tasas(client, dia: Optional[str] = None, desde: Optional[str] = None,
+                 hasta: Optional[str] = None, columnas: str = "nombre_tasa, valor, fecha_actual",
+                 filtros: Optional[Callable[[Any], Any]] = None,
+                 tam_pagina: int = TAM_PAGINA, tabla: str = TABLA_HISTORIA) -> Iterator[Dict[str, Any]]:
+    """Recorre ``tasas`` (o ``tabla``) de la más nueva a la más vieja, en páginas por keyset.
+
+    PostgREST corta los resultados (1000 filas por defecto), así que un
+    select sin paginar puede perder filas en silencio. Aquí cada página pide
+    ``fecha_actual <= cursor`` ordenado por (fecha_actual desc, nombre_tasa)
+    y salta las filas del cursor que ya se entregaron, de modo que no se
+    pierden ni repiten empates. ``dia`` (YYYY-MM-DD) acota a ese día y la
+    lectura termina apenas se pasa de él. ``filtros`` recibe el query
+    builder y devuelve el builder con filtros extra.
+    """
+    if dia is not None:
+        desde = desde or f"{dia}T00:00:00"
+        hasta = hasta or f"{dia}T23:59:59.999999"
+    if "fecha_actual" not in columnas or "nombre_tasa" not in columnas:
+        raise ValueError("iterar_tasas necesita fecha_actual y nombre_tasa en las columnas")
+
+    cursor, en_cursor = hasta, 0
+    while True:
+        q = _pagina_tasas(client, tabla, columnas, filtros, desde, cursor, en_cursor, tam_pagina)
+        data = q.execute().data or []
+        yield from data
+        if len(data) < tam_pagina: return
+        cursor, en_cursor = _avanzar_cursor(data, cursor, en_cursor)
+
+async def leer_tasas_actuales_async(client, tam_pagina: int = TAM_PAGINA) -> List[Dict[str, Any]]:
+    """leer_tasas_actuales con un cliente PostgREST async, con el mismo keyset."""
+    out: List[Dict[str, Any]] = []
+    cursor, en_cursor = None, 0
+    while True:
+        q = _pagina_tasas(client, TABLA_ACTUALES, COLUMNAS_ACTUALES, None, None, cursor, en_cursor, tam_pagina)
+        data = (await q.execute()).data or []
+        out.extend(data)
+        if len(data) < tam_pagina: return out
+        cursor, en_cursor = _avanzar_cursor(data, cursor, en_cursor)
+
+def _params_ultimas(dia: Optional[str], prefijo: Optional[str], par: Optional[str],
+                    despues: Optional[str], tam_pagina: int) -> Dict[str, Any]:
+    return {"p_dia": dia or hoy_iso_ve(), "p_prefijo": prefijo, "p_par": par,
+            "p_despues": despues, "p_limite": tam_pagina}
+
+def leer_ultimas_del_dia(client, dia: Optional[str] = None, prefijo: Optional[str] = None,
+                         par: Optional[str] = None, tam_pagina: int = TAM_PAGINA) -> List[Dict[str, Any]]:
+    """Fila más nueva por nombre_tasa del día ``dia`` (hoy VE por defecto), filtrada en el servidor.
+
+    La función devuelve una fila por nombre en orden de nombre_tasa; se pide
+    por páginas (keyset sobre el nombre) para no chocar con el max-rows de
+    PostgREST, hasta que vuelve una página incompleta.
+    """
+    out: List[Dict[str, Any]] = []
+    despues = None
+    while True:
+        params = _params_ultimas(dia, prefijo, par, despues, tam_pagina)
+        data = client.rpc(RPC_ULTIMAS_DEL_DIA, params).execute().data or []
+        out.extend(data)
+        if len(data) < tam_pagina: return out
+        despues = data[-1]["nombre_tasa"]
+
+async def leer_ultimas_del_dia_async(client, tam_pagina: int = TAM_PAGINA) -> List[Dict[str, Any]]:
+    """leer_ultimas_del_dia (hoy, sin filtros) con un cliente PostgREST async."""
+    out: List[Dict[str, Any]] = []
+    despues = None
+    while True:
+        params = _params_ultimas(None, None, None, despues, tam_pagina)
+        data = (await client.rpc(RPC_ULTIMAS_DEL_DIA, params).execute()).data or []
+        out.extend(data)
+        if len(data) < tam_pagina: return out
+        despues = data[-1]["nombre_tasa"]
+
+def leer_tasas_con_respaldo(client) -> List[Dict[str, Any]]:
+    """Últimos valores; si tasas_actuales falla o está vacía, la historia de hoy."""
+    try:
+        data = leer_tasas_actuales(client)
+        if data: return data
+    except Exception as e:
+        print(f"⚠️ {TABLA_ACTUALES} no disponible, se lee la historia: {e}")
+    return list(iterar_tasas(client, dia=hoy_iso_ve()))
+
+_snapshot_compartido: Optional[LectorSnapshot] = LectorSnapshot() if SNAPSHOT_PATH else None
+
+# Consultas idénticas concurrentes de ultima_tasa comparten una sola ida a la base
+vuelos_ultima_tasa = VueloUnico()
+
+def ultima_tasa(client, nombre: str) -> Optional[float]:
+    """Último valor guardado de ``nombre`` (None si no hay)."""
+    snap = _snapshot_compartido
+    if snap is not None and snap.asegurar():
+        # Como en CacheTasas._usar_snapshot: solo se confía en un snapshot y una entrada de hoy
+        hoy = hoy_iso_ve()
+        entrada = snap.get(nombre) if snap.meta.get("dia") == hoy else None
+        if entrada is not None and entrada[1].startswith(hoy): return entrada[0]
+    return vuelos_ultima_tasa.hacer((id(client), nombre), _ultima_tasa_db, client, nombre)
+
+def _ultima_tasa_db(client, nombre: str) -> Optional[float]:
+    try:
+        data = leer_tasas_actuales(client, [nombre])
+        if data: return float(data[0]["valor"])
+    except Exception as e:
+        print(f"⚠️ {TABLA_ACTUALES} no disponible para {nombre}: {e}")
+    res = (client.table(TABLA_HISTORIA).select("valor").eq("nombre_tasa", nombre)
+           .order("fecha_actual", desc=True).limit(1).execute())
+    return float(res.data[0]["valor"]) if res.data else None
+
+class CacheTasas:
+    """Último valor de hoy por nombre_tasa (en minúsculas), en memoria.
+
+    Si hay un snapshot de hoy, los valores se leen de él (mmap) y solo se
+    revisa si cambió de versión. Si no, se recarga cuando aparece un run_id
+    nuevo en tasas_actuales (sondeado cada CACHE_SONDEO_S), cuando cambia el
+    día o al vencer CACHE_TTL_S.
+    """
+
+    def __init__(self, client, ttl_s: float = CACHE_TTL_S, sondeo_s: float = CACHE_SONDEO_S,
+                 snapshot: Optional[LectorSnapshot] = _snapshot_compartido):
+        self.client = client
+        self.snapshot = snapshot
+        self._version_snapshot: Optional[int] = None
+        self.ttl_s = ttl_s
+        self.sondeo_s = sondeo_s
+        self.valores: Dict[str, Tuple[float, str]] = {}
+        self.nombres: Dict[str, str] = {}  # minúsculas -> nombre_tasa original
+        self._indice: Optional[Tuple[Tuple[str, ...], Dict[str, List[str]]]] = None
+        self.run_id: Optional[str] = None
+        self.dia: Optional[str] = None
+        self._cargado_en = 0.0
+        self._sondeado_en = 0.0
+        # Sube cada vez que cambia el contenido (recarga, snapshot nuevo o avisos en vivo)
+        self.generacion = 0
+        # Protege el estado; las consultas a la base van fuera del lock
+        self._lock = threading.RLock()
+        # Los hilos que piden la misma recarga/sondeo a la vez comparten una sola consulta
+        self.vuelos = VueloUnico()
+        # True mientras llegan avisos en vivo (tiempo_real_tasas); el sondeo de run_id se omite
+        self.en_vivo = False
+        self._en_vivo_por_run: Dict[str, int] = {}
+
+    def _ultimo_run(self) -> Optional[str]:
+        res = (self.client.table(TABLA_ACTUALES).select("run_id")
+               .order("fecha_actual", desc=True).limit(1).execute())
+        return res.data[0]["run_id"] if res.data else None
+
+    def cargar(self, filas: Iterable[Dict[str, Any]], run_id: Optional[str] = None):
+        """Reemplaza el contenido con las filas de hoy (la más nueva gana)."""
+        hoy = hoy_iso_ve()
+        valores: Dict[str, Tuple[datetime, float]] = {}
+        nombres: Dict[str, str] = {}
+        for row in filas:
+            if run_id is None: run_id = row.get("run_id")
+            fa = row.get("fecha_actual") or ""
+            if not fa.startswith(hoy): continue
+            original = row.get("nombre_tasa") or ""
+            nombre = original.lower()
+            fecha = parser.isoparse(fa)
+            previa = valores.get(nombre)
+            if previa is None or fecha > previa[0]:
+                valores[nombre] = (fecha, float(row["valor"]))
+                nombres[nombre] = original
+        self.valores = {n: (v, f.strftime("%H:%M")) for n, (f, v) in valores.items()}
+        self.nombres = nombres
+        self._indice = None
+        self.run_id = run_id
+        self.dia = hoy
+        self.generacion += 1
+        self._cargado_en = self._sondeado_en = time.monotonic()
+
+    def refrescar(self):
+        try:
+            run_id = self._ultimo_run()
+        except Exception:
+            run_id = None
+        try:
+            filas = leer_ultimas_del_dia(self.client)
+        except Exception as e:
+            print(f"⚠️ RPC {RPC_ULTIMAS_DEL_DIA} no disponible, se usa el respaldo: {e}")
+            filas = leer_tasas_con_respaldo(self.client)
+        with self._lock:
+            self.cargar(filas, run_id)
+        print(f"🔄 Caché de tasas: {len(self.valores)} tasas de hoy (run {self.run_id}).")
+
+    def _usar_snapshot(self) -> bool:
+        """True si el snapshot es de hoy; al cambiar de versión se rehacen los nombres."""
+        snap = self.snapshot
+        if snap is None or not snap.asegurar(): return False
+        hoy = hoy_iso_ve()
+        if snap.meta.get("dia") != hoy: return False
+        if snap.version != self._version_snapshot or self.dia != hoy:
+            self.nombres = {n: o for n, o in snap.nombres().items() if snap.get(n)[1].startswith(hoy)}
+            self.valores = {}
+            self._indice = None
+            self.run_id = snap.meta.get("run_id")
+            self.dia = hoy
+            self._version_snapshot = snap.version
+            self.generacion += 1
+            print(f"🗂️ Caché de tasas desde snapshot: {len(self.nombres)} tasas de hoy (run {self.run_id}).")
+        return True
+
+    def recargar(self):
+        """Recarga completa compartida: si otro hilo ya está recargando, se espera esa."""
+        self.vuelos.hacer("refrescar", self.refrescar)
+
+    def _pendiente(self, ahora: float) -> Optional[str]:
+        """Qué hace falta para estar al día: None, "refrescar" o "sondear". Con el lock tomado."""
+        if self._usar_snapshot(): return None
+        if self._version_snapshot is not None:
+            # Se dejó de usar el snapshot (otro día o archivo borrado): vuelta a la red
+            self._version_snapshot = None
+            return "refrescar"
+        if self.dia != hoy_iso_ve() or ahora - self._cargado_en >= self.ttl_s: return "refrescar"
+        if self.en_vivo or ahora - self._sondeado_en < self.sondeo_s: return None
+        self._sondeado_en = ahora
+        return "sondear"
+
+    def asegurar(self):
+        """Deja la caché al día; barato si no hubo corrida nueva."""
+        with self._lock:
+            pendiente = self._pendiente(time.monotonic())
+        if pendiente == "sondear":
+            try:
+                if self.vuelos.hacer("sondeo", self._ultimo_run) == self.run_id: return
+            except Exception as e:
+                print(f"⚠️ No se pudo sondear el último run: {e}")
+                return
+            pendiente = "refrescar"
+        if pendiente == "refrescar": self.recargar()
+
+    def estadisticas_vuelos(self) -> Dict[str, int]:
+        return self.vuelos.estadisticas()
+
+    def aplicar(self, filas: Iterable[Dict[str, Any]]) -> int:
+        """Aplica filas sueltas (avisos en vivo) sin recargar todo; devuelve cuántas entraron."""
+        hoy = hoy_iso_ve()
+        n = 0
+        with self._lock:
+            if self._version_snapshot is not None or self.dia != hoy: return 0
+            for row in filas:
+                fa = row.get("fecha_actual") or ""
+                original = row.get("nombre_tasa") or ""
+                if not fa.startswith(hoy) or not original or row.get("valor") is None: continue
+                self.valores[original.lower()] = (float(row["valor"]), parser.isoparse(fa).strftime("%H:%M"))
+                self.nombres[original.lower()] = original
+                run = row.get("run_id")
+                if run: self._en_vivo_por_run[run] = self._en_vivo_por_run.get(run, 0) + 1
+                n += 1
+            if n:
+                self._indice = None
+                self.generacion += 1
+        return n
+
+    def marcar_run(self, run_id: Optional[str], esperadas: Optional[int] = None):
+        """Registra una corrida terminada; si faltaron avisos de sus filas, recarga todo."""
+        with self._lock:
+            recibidas = self._en_vivo_por_run.pop(run_id, 0)
+            self._en_vivo_por_run.clear()
+            if self._version_snapshot is not None: return
+            completa = esperadas is None or recibidas >= esperadas
+            if completa:
+                if run_id: self.run_id = run_id
+                self._sondeado_en = time.monotonic()
+                return
+        print(f"🔄 Run {run_id}: {recibidas}/{esperadas} avisos recibidos, se recarga la caché.")
+        self.recargar()
+
+    def get(self, nombre: str) -> Tuple[Optional[float], Optional[str]]:
+        """(valor, "HH:MM") de hoy para ``nombre``; (None, None) si no hay."""
+        if self._version_snapshot is not None:
+            clave = nombre.lower()
+            entrada = self.snapshot.get(clave) if clave in self.nombres else None
+            return (entrada[0], entrada[1][11:16]) if entrada else (None, None)
+        return self.valores.get(nombre.lower(), (None, None))
+
+    def pares_por_pais(self, paises: Iterable[str]) -> Dict[str, List[str]]:
+        """País (minúsculas) -> pares disponibles hoy, ordenados.
+
+        Se arma una vez por carga (es decir, una vez por corrida de tasas).
+        """
+        clave = tuple(p.lower() for p in paises)
+        indice = self._indice
+        if indice is not None and indice[0] == clave: return indice[1]
+
+        pares: Dict[str, set] = {p: set() for p in clave}
+        for nombre, original in self.nombres.items():
+            if not nombre.startswith("tasa full ") or "promedio" in nombre: continue
+            par = original[len("Tasa full "):]
+            for p in clave:
+                if p in nombre: pares[p].add(par)
+        if "colombia" in pares and any(n in self.nombres for n in NOMBRES_COP_USDT):
+            pares["colombia"].add("COP USDT")
+        resultado = {p: sorted(v) for p, v in pares.items()}
+        self._indice = (clave, resultado)
+        return resultado
+
+class CacheTasasAsync(CacheTasas):
+    """CacheTasas para asyncio: ``client`` es un cliente PostgREST async.
+
+    asegurar() (sync) solo mira el snapshot local, así TarjetasTasas la puede
+    llamar desde el event loop; la red va por asegurar_async().
+    """
+
+    def __init__(self, client, ttl_s: float = CACHE_TTL_S, sondeo_s: float = CACHE_SONDEO_S,
+                 snapshot: Optional[LectorSnapshot] = _snapshot_compartido):
+        super().__init__(client, ttl_s, sondeo_s, snapshot)
+        self.vuelos_async = VueloUnicoAsync()
+
+    def asegurar(self):
+        with self._lock:
+            self._usar_snapshot()
+
+    async def _ultimo_run_async(self) -> Optional[str]:
+        res = await (self.client.table(TABLA_ACTUALES).select("run_id")
+                     .order("fecha_actual", desc=True).limit(1).execute())
+        return res.data[0]["run_id"] if res.data else None
+
+    async def refrescar_async(self):
+        try:
+            run_id = await self._ultimo_run_async()
+        except Exception:
+            run_id = None
+        try:
+            filas = await leer_ultimas_del_dia_async(self.client)
+        except Exception as e:
+            print(f"⚠️ RPC {RPC_ULTIMAS_DEL_DIA} no disponible, se usa {TABLA_ACTUALES}: {e}")
+            filas = await leer_tasas_actuales_async(self.client)
+        with self._lock:
+            self.cargar(filas, run_id)
+        print(f"🔄 Caché de tasas: {len(self.valores)} tasas de hoy (run {self.run_id}).")
+
+    async def asegurar_async(self):
+        """Igual que CacheTasas.asegurar, sin bloquear el event loop."""
+        with self._lock:
+            pendiente = self._pendiente(time.monotonic())
+        if pendiente == "sondear":
+            try:
+                if await self.vuelos_async.hacer("sondeo", self._ultimo_run_async) == self.run_id: return
+            except Exception as e:
+                print(f"⚠️ No se pudo sondear el último run: {e}")
+                return
+            pendiente = "refrescar"
+        if pendiente == "refrescar": await self.vuelos_async.hacer("refrescar", self.refrescar_async)
+
+    def estadisticas_vuelos(self) -> Dict[str, int]:
+        return self.vuelos_async.estadisticas()
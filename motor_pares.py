@@ -0,0 +1,79 @@
+"""Cálculo vectorizado de la matriz de pares para guardar_tasas.
+
+Un vector de precios por lado (BUY = origen, SELL = destino), una matriz de
+márgenes y una máscara de dirección precalculadas por combinación de
+mercados; las tasas full/público/promocional/mayorista y sus decimales salen
+en una sola pasada de operaciones de arrays.
+"""
+from typing import Callable, Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+# (umbral, decimales): la primera regla con t < umbral gana; si ninguna, 2
+UMBRALES_DECIMALES: List[Tuple[float, int]] = [(0.0001, 8), (0.01, 6), (1, 5), (100, 4), (1000, 3)]
+DECIMALES_USA = 6
+
+class MatrizPares:
+    """Márgenes, dirección y decimales base de todos los pares origen × destino."""
+
+    def __init__(self, origenes: Sequence[str], destinos: Sequence[str],
+                 margen_de: Callable[[str], Dict[str, float]],
+                 pares_sumar: Set[str],
+                 decimales_base: Callable[[str, str], int]):
+        self.origenes = list(origenes)
+        self.destinos = list(destinos)
+        forma = (len(self.origenes), len(self.destinos))
+        self.margen_publico = np.zeros(forma)
+        self.margen_mayorista = np.zeros(forma)
+        self.invertido = np.zeros(forma, dtype=bool)
+        self.valido = np.zeros(forma, dtype=bool)
+        self.dec_base = np.zeros(forma, dtype=np.int64)
+        self.destino_usa = np.array([d == "USA" for d in self.destinos])[None, :].repeat(forma[0], axis=0)
+
+        for i, o in enumerate(self.origenes):
+            for j, d in enumerate(self.destinos):
+                if o == d: continue
+                base = f"{o} - {d}"
+                m = margen_de(base)
+                self.valido[i, j] = True
+                self.margen_publico[i, j] = m["publico"]
+                self.margen_mayorista[i, j] = m["mayorista"]
+                # Destino USA siempre va en sentido directo, aunque esté en pares_sumar
+                self.invertido[i, j] = base in pares_sumar and d != "USA"
+                self.dec_base[i, j] = decimales_base(o, d)
+
+    def calcular(self, p_origen: np.ndarray, p_destino: np.ndarray) -> Dict[str, np.ndarray]:
+        """Matrices full/publico/promocional/mayorista/decimales (origen × destino)."""
+        po = np.asarray(p_origen, dtype=float)[:, None]
+        pd = np.asarray(p_destino, dtype=float)[None, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            full = np.where(self.invertido, po / pd, pd / po)
+        # Invertido suma el margen; directo lo resta
+        signo = np.where(self.invertido, 1.0, -1.0)
+        publico = full * (1 + signo * self.margen_publico)
+        mayorista = full * (1 + signo * self.margen_mayorista)
+        promocional = (publico + mayorista) / 2
+
+        condiciones = [full < umbral for umbral, _ in UMBRALES_DECIMALES]
+        por_magnitud = np.select(condiciones, [d for _, d in UMBRALES_DECIMALES], default=2)
+        decimales = np.where(self.destino_usa, DECIMALES_USA, np.maximum(self.dec_base, por_magnitud))
+
+        return {
+            "full": full, "publico": publico, "promocional": promocional,
+            "mayorista": mayorista, "decimales": decimales,
+            "valido": self.valido & np.isfinite(full),
+        }
+
+_cache_matrices: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], MatrizPares] = {}
+
+def matriz_para(origenes: Sequence[str], destinos: Sequence[str],
+                margen_de: Callable[[str], Dict[str, float]],
+                pares_sumar: Set[str],
+                decimales_base: Callable[[str, str], int]) -> MatrizPares:
+    """MatrizPares precalculada para esta combinación de mercados (se reutiliza entre corridas)."""
+    clave = (tuple(origenes), tuple(destinos))
+    mp = _cache_matrices.get(clave)
+    if mp is None:
+        mp = MatrizPares(origenes, destinos, margen_de, pares_sumar, decimales_base)
+        _cache_matrices[clave] = mp
+    return mp
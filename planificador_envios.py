@@ -0,0 +1,120 @@
+"""Cola de envíos a Telegram que respeta los límites de la API.
+
+- Global: como máximo ENVIOS_GLOBAL_POR_S mensajes por segundo (~30).
+- Por chat: como máximo ENVIOS_CHAT_POR_S por segundo (1).
+- Un 429 pausa todos los envíos el ``retry_after`` que indica Telegram y el
+  mensaje vuelve a la cola.
+- Se atiende primero la prioridad más baja (0 = más urgente) y, dentro de
+  una prioridad, por orden de llegada.
+
+Un solo hilo despacha; ``encolar`` es seguro desde cualquier hilo.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+ENVIOS_GLOBAL_POR_S = float(os.getenv("ENVIOS_GLOBAL_POR_S", "30"))
+ENVIOS_CHAT_POR_S = float(os.getenv("ENVIOS_CHAT_POR_S", "1"))
+ENVIOS_REINTENTOS = int(os.getenv("ENVIOS_REINTENTOS", "3"))
+
+def _retry_after(e: Exception) -> Optional[float]:
+    """Segundos de espera si ``e`` es un 429 de Telegram."""
+    if getattr(e, "error_code", None) != 429: return None
+    params = (getattr(e, "result_json", None) or {}).get("parameters") or {}
+    return float(params.get("retry_after", 1))
+
+class PlanificadorEnvios:
+    def __init__(self, bot, global_por_s: float = ENVIOS_GLOBAL_POR_S, chat_por_s: float = ENVIOS_CHAT_POR_S,
+                 reintentos: int = ENVIOS_REINTENTOS):
+        self.bot = bot
+        self.intervalo_global = 1.0 / global_por_s
+        self.intervalo_chat = 1.0 / chat_por_s
+        self.reintentos = reintentos
+        self._cola: List[Tuple[int, int, Dict[str, Any]]] = []       # (prioridad, seq, envío)
+        self._diferidos: List[Tuple[float, int, int, Dict[str, Any]]] = []  # (listo_en, prioridad, seq, envío)
+        self._seq = itertools.count()
+        self._proximo_chat: Dict[int, float] = {}
+        self._proximo_global = 0.0
+        self._cond = threading.Condition()
+        self._hilo: Optional[threading.Thread] = None
+        self.enviados = 0
+        self.fallidos = 0
+        self.limitados = 0  # respuestas 429
+
+    def encolar(self, chat_id: int, texto: str, prioridad: int = 1, **kwargs):
+        envio = {"chat_id": chat_id, "texto": texto, "kwargs": kwargs, "intentos": 0}
+        with self._cond:
+            heapq.heappush(self._cola, (prioridad, next(self._seq), envio))
+            self._cond.notify()
+        self.iniciar()
+
+    def pendientes(self) -> int:
+        with self._cond:
+            return len(self._cola) + len(self._diferidos)
+
+    def _siguiente(self) -> Dict[str, Any]:
+        """Saca el envío más prioritario cuyo chat ya puede recibir; espera lo necesario."""
+        with self._cond:
+            while True:
+                ahora = time.monotonic()
+                while self._diferidos and self._diferidos[0][0] <= ahora:
+                    _, prio, seq, envio = heapq.heappop(self._diferidos)
+                    heapq.heappush(self._cola, (prio, seq, envio))
+                while self._cola:
+                    prio, seq, envio = heapq.heappop(self._cola)
+                    listo = self._proximo_chat.get(envio["chat_id"], 0.0)
+                    if listo <= ahora:
+                        envio["prioridad"], envio["seq"] = prio, seq
+                        return envio
+                    heapq.heappush(self._diferidos, (listo, prio, seq, envio))
+                espera = (self._diferidos[0][0] - ahora) if self._diferidos else None
+                self._cond.wait(espera)
+
+    def _enviar(self, envio: Dict[str, Any]):
+        espera = self._proximo_global - time.monotonic()
+        if espera > 0: time.sleep(espera)
+        chat_id = envio["chat_id"]
+        try:
+            self.bot.send_message(chat_id, envio["texto"], **envio["kwargs"])
+            self.enviados += 1
+        except Exception as e:
+            retry = _retry_after(e)
+            envio["intentos"] += 1
+            if retry is not None:
+                self.limitados += 1
+                print(f"⏳ Telegram pidió esperar {retry:g}s (chat {chat_id}).")
+                self._proximo_global = time.monotonic() + retry
+            if retry is not None or envio["intentos"] < self.reintentos:
+                # Conserva su lugar: el chat sigue recibiendo en orden
+                with self._cond:
+                    heapq.heappush(self._cola, (envio["prioridad"], envio["seq"], envio))
+            else:
+                self.fallidos += 1
+                print(f"⚠️ Envío a {chat_id} descartado: {e}")
+        finally:
+            ahora = time.monotonic()
+            self._proximo_global = max(self._proximo_global, ahora + self.intervalo_global)
+            with self._cond:
+                self._proximo_chat[chat_id] = ahora + self.intervalo_chat
+
+    def _despachar(self):
+        while True:
+            envio = self._siguiente()
+            try:
+                self._enviar(envio)
+            except Exception as e:
+                print(f"⚠️ Error en el planificador de envíos: {e}")
+
+    def iniciar(self):
+        if self._hilo is None:
+            with self._cond:
+                if self._hilo is None:
+                    self._hilo = threading.Thread(target=self._despachar, name="planificador-envios", daemon=True)
+                    self._hilo.start()
+
+    def estadisticas(self) -> Dict[str, int]:
+        return {"enviados": self.enviados, "fallidos": self.fallidos, "limitados": self.limitados,
+                "pendientes": self.pendientes()}
@@ -0,0 +1,126 @@
+"""Texto libre -> par canónico ("chile - venezuela"), con un índice de alias armado una vez.
+
+El texto se normaliza (minúsculas, sin acentos, separadores a espacios) y se
+recorre de una pasada contra un trie de tokens: se toma siempre el alias más
+largo que calce ("estados unidos" antes que "estados"). Los alias cubren
+nombres, códigos ISO de país y moneda, métodos (zelle), gentilicios y
+errores de tipeo comunes; una palabra que no calce se compara además contra
+los alias con difflib, por si viene mal escrita.
+
+Los alias débiles (dos letras como "ve" o "pa", y palabras comunes como
+"dolar", "sol" o "real") solo cuentan cuando el texto parece un par: a lo
+sumo dos palabras, o un separador ("/", "-", "→") entre ellas. Así "cuánto
+está el dólar en chile" es Chile y no USA - Chile.
+
+Las claves que devuelve son las de DECIMALS_BY_PAIR: países sin acentos en
+minúsculas separados por " - ", y "colombia usdt" para COP USDT.
+"""
+import difflib
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+USDT = "usdt"
+CLAVE_COP_USDT = "colombia usdt"
+
+# Clave sin acentos -> nombre como en el menú (config_bot.emojis_paises)
+PAISES = {
+    "venezuela": "venezuela", "colombia": "colombia", "argentina": "argentina", "peru": "perú",
+    "brasil": "brasil", "europa": "europa", "usa": "usa", "mexico": "méxico",
+    "panama": "panamá", "ecuador": "ecuador", "chile": "chile", "uruguay": "uruguay",
+}
+
+ALIAS = {
+    "venezuela": ["ve", "ven", "ves", "vef", "vzla", "bs", "bolivar", "bolivares", "venezolano",
+                  "venezula", "venezuala", "venesuela", "venezuel"],
+    "colombia": ["co", "col", "cop", "colombiano", "pesos colombianos", "bancolombia",
+                 "colonbia", "columbia", "colombi"],
+    "argentina": ["ar", "arg", "ars", "argentino", "argentin", "argenitna", "argetina"],
+    "peru": ["pe", "pen", "soles", "sol", "peruano", "bcp"],
+    "brasil": ["br", "bra", "brl", "brazil", "reales", "real", "brasileño", "pix"],
+    "europa": ["eu", "eur", "euro", "euros", "bizum", "sepa", "españa", "espana"],
+    "usa": ["us", "usd", "eeuu", "ee uu", "estados unidos", "zelle", "zele", "dolar", "dolares"],
+    "mexico": ["mx", "mex", "mxn", "mejico", "mexicano", "mexíco"],
+    "panama": ["pa", "pab", "panameño"],
+    "ecuador": ["ec", "ecu", "ecuatoriano"],
+    "chile": ["cl", "clp", "chl", "chileno", "chlie", "chiel"],
+    "uruguay": ["uy", "uyu", "uru", "uruguayo", "uruguai"],
+    USDT: ["tether", "usdt"],
+}
+
+# Palabras que también se usan en frases normales; las de dos letras se suman solas
+_COMUNES = {"dolar", "dolares", "sol", "soles", "real", "reales", "euro", "euros", "ven", "col"}
+
+def _es_debil(alias_normalizado: str) -> bool:
+    return len(alias_normalizado) <= 2 or alias_normalizado in _COMUNES
+
+_SEPARADORES = re.compile(r"[/\-–—>→,;:|()\[\]]+|\ba\b|\bpara\b|\bde\b|\bx\b")
+
+def _sin_acentos(s: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
+
+def normalizar(texto: str) -> List[str]:
+    s = _sin_acentos((texto or "").lower()).replace(".", " ")
+    return _SEPARADORES.sub(" ", s).split()
+
+_SEPARADOR_DE_PAR = re.compile(r"[/\-–—>→|]")
+
+def _armar_trie(con_debiles: bool) -> Tuple[Dict, List[str], Dict[str, str]]:
+    trie: Dict = {}
+    simples: Dict[str, str] = {}
+    for clave, alias in ALIAS.items():
+        for a in [clave, *alias]:
+            toks = normalizar(a)
+            if not con_debiles and _es_debil(" ".join(toks)): continue
+            nodo = trie
+            for t in toks: nodo = nodo.setdefault(t, {})
+            nodo[None] = clave
+            if len(toks) == 1: simples[toks[0]] = clave
+    # Para difflib solo palabras con cuerpo: "ve" o "co" mal escritos no se adivinan
+    return trie, [a for a in simples if len(a) >= 4], simples
+
+# (trie, candidatos para difflib, alias de una palabra -> clave), con y sin alias débiles
+_INDICES = {True: _armar_trie(True), False: _armar_trie(False)}
+
+@lru_cache(maxsize=1024)
+def _difuso(token: str, con_debiles: bool) -> Optional[str]:
+    if len(token) < 4: return None
+    _, para_difuso, simples = _INDICES[con_debiles]
+    cerca = difflib.get_close_matches(token, para_difuso, n=1, cutoff=0.8)
+    return simples[cerca[0]] if cerca else None
+
+def claves_en_texto(texto: str) -> List[str]:
+    """Países (y "usdt") que aparecen en el texto, en orden y sin repetir seguidos."""
+    toks = normalizar(texto)
+    con_debiles = len(toks) <= 2 or bool(_SEPARADOR_DE_PAR.search(texto or ""))
+    trie = _INDICES[con_debiles][0]
+    out: List[str] = []
+    i = 0
+    while i < len(toks):
+        nodo, j, hallado, fin = trie, i, None, i
+        while j < len(toks) and toks[j] in nodo:
+            nodo = nodo[toks[j]]
+            j += 1
+            if None in nodo: hallado, fin = nodo[None], j
+        if hallado is None:
+            hallado, fin = _difuso(toks[i], con_debiles), i + 1
+        if hallado is not None and (not out or out[-1] != hallado): out.append(hallado)
+        i = max(fin, i + 1)
+    return out
+
+@lru_cache(maxsize=4096)
+def resolver_par(texto: str) -> Optional[str]:
+    """Clave canónica del par ("chile - venezuela", "colombia usdt") o None."""
+    claves = claves_en_texto(texto)
+    if len(claves) != 2: return None
+    a, b = claves
+    if USDT in claves:
+        return CLAVE_COP_USDT if {a, b} == {"colombia", USDT} else None
+    return f"{a} - {b}"
+
+@lru_cache(maxsize=1024)
+def pais_en_texto(texto: str) -> Optional[str]:
+    """Único país mencionado, con el nombre del menú ("perú"); None si no hay uno solo."""
+    claves = [c for c in claves_en_texto(texto) if c != USDT]
+    return PAISES[claves[0]] if len(claves) == 1 else None
@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import telebot
 from supabase_client import supabase
+from lector_tasas import ultima_tasa
 
 # =========================
 # Configuración
@@ -42,19 +43,14 @@ def normalizar_tipo(valor: str | None) -> str:
 # =========================
 def obtener_tasa_usdt_por_pais(pais: str):
     """
-    Busca la última tasa 'USDT en {pais}' en Supabase y devuelve su valor (float).
+    Busca la última tasa 'USDT en {pais}' (tabla tasas_actuales) y devuelve su valor (float).
     """
     nombre_tasa = f"USDT en {pais}"
     try:
-        resp = supabase.table("tasas") \
-            .select("valor, fecha_actual, nombre_tasa") \
-            .eq("nombre_tasa", nombre_tasa) \
-            .order("fecha_actual", desc=True) \
-            .limit(1) \
-            .execute()
-        print(f"[DEBUG] tasa query {nombre_tasa} -> {resp.data}")
-        if resp.data:
-            return float(resp.data[0]["valor"])
+        valor = ultima_tasa(supabase, nombre_tasa)
+        print(f"[DEBUG] tasa query {nombre_tasa} -> {valor}")
+        if valor is not None:
+            return valor
         print(f"❌ No se encontró tasa para {nombre_tasa}")
         return None
     except Exception as e:
@@ -0,0 +1,141 @@
+"""Snapshot binario de las últimas tasas, compartido entre procesos.
+
+La corrida de tasas (guardar_tasas) publica un archivo versionado con todos
+los últimos valores; se escribe en un temporal y se renombra, así que los
+lectores nunca ven un archivo a medias. Los bots lo abren con mmap y leen
+los valores directamente del mapa, reabriéndolo solo cuando cambia la
+versión.
+
+Formato (little-endian):
+    cabecera   magic "TSNP", formato, versión (ns), creado (epoch), n, largo meta
+    meta       JSON utf-8 (run_id, dia, ...)
+    entradas   n × (offset nombre, largo nombre, valor f64, fecha "YYYY-MM-DDTHH:MM")
+    nombres    nombre_tasa originales, utf-8, concatenados
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Dict, Any, Optional, Tuple, NamedTuple
+
+MAGIC = b"TSNP"
+FORMATO = 1
+_CABECERA = struct.Struct("<4sHxxqdII")
+_ENTRADA = struct.Struct("<IHxxd16s")
+
+# Vacío = sin snapshot (todo por red)
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_TASAS_PATH", os.path.join(tempfile.gettempdir(), "tasanator_tasas.snap"))
+
+def publicar_snapshot(tasas: Dict[str, Tuple[float, str]], meta: Dict[str, Any],
+                      path: str = SNAPSHOT_PATH) -> int:
+    """Escribe ``{nombre_tasa: (valor, fecha_iso)}`` de forma atómica; devuelve la versión."""
+    version = time.time_ns()
+    meta_b = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    nombres = sorted(tasas)
+    nombres_b = [n.encode("utf-8") for n in nombres]
+
+    inicio_nombres = _CABECERA.size + len(meta_b) + _ENTRADA.size * len(nombres)
+    partes = [_CABECERA.pack(MAGIC, FORMATO, version, time.time(), len(nombres), len(meta_b)), meta_b]
+    offset = inicio_nombres
+    for nombre, nb in zip(nombres, nombres_b):
+        valor, fecha = tasas[nombre]
+        partes.append(_ENTRADA.pack(offset, len(nb), float(valor), str(fecha)[:16].encode("ascii")))
+        offset += len(nb)
+    partes.extend(nombres_b)
+
+    directorio = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".snap-", dir=directorio)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"".join(partes))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp): os.unlink(tmp)
+        raise
+    return version
+
+class _Vista(NamedTuple):
+    mm: mmap.mmap
+    version: int
+    meta: Dict[str, Any]
+    offsets: Dict[str, int]  # nombre en minúsculas -> offset de su entrada
+    originales: Dict[str, str]  # nombre en minúsculas -> nombre_tasa original
+    firma: Tuple[int, int, int]
+
+def _abrir(path: str, firma: Tuple[int, int, int]) -> _Vista:
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, formato, version, _, n, meta_len = _CABECERA.unpack_from(mm, 0)
+    if magic != MAGIC or formato != FORMATO:
+        mm.close()
+        raise ValueError(f"snapshot con formato desconocido: {magic!r} v{formato}")
+    meta = json.loads(bytes(mm[_CABECERA.size:_CABECERA.size + meta_len]).decode("utf-8"))
+    offsets: Dict[str, int] = {}
+    originales: Dict[str, str] = {}
+    pos = _CABECERA.size + meta_len
+    for _ in range(n):
+        off, largo, _, _ = _ENTRADA.unpack_from(mm, pos)
+        nombre = bytes(mm[off:off + largo]).decode("utf-8")
+        offsets[nombre.lower()] = pos
+        originales[nombre.lower()] = nombre
+        pos += _ENTRADA.size
+    return _Vista(mm, version, meta, offsets, originales, firma)
+
+class LectorSnapshot:
+    """Lee el snapshot por mmap y lo reabre solo si el archivo cambió de versión."""
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        self._vista: Optional[_Vista] = None
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._vista.version if self._vista else None
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        return self._vista.meta if self._vista else {}
+
+    def asegurar(self) -> bool:
+        """True si hay un snapshot cargado y al día con el archivo."""
+        if not self.path: return False
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._vista = None
+            return False
+        firma = (st.st_ino, st.st_mtime_ns, st.st_size)
+        vista = self._vista
+        if vista is not None and vista.firma == firma: return True
+        try:
+            # El mmap anterior se libera solo cuando ningún hilo lo está leyendo
+            self._vista = _abrir(self.path, firma)
+        except Exception as e:
+            print(f"⚠️ Snapshot de tasas ilegible ({self.path}): {e}")
+            return vista is not None
+        return True
+
+    def get(self, nombre: str) -> Optional[Tuple[float, str]]:
+        """(valor, fecha "YYYY-MM-DDTHH:MM") de ``nombre``, leído del mapa."""
+        vista = self._vista
+        if vista is None: return None
+        pos = vista.offsets.get(nombre.lower())
+        if pos is None: return None
+        _, _, valor, fecha = _ENTRADA.unpack_from(vista.mm, pos)
+        return valor, fecha.decode("ascii")
+
+    def nombres(self) -> Dict[str, str]:
+        vista = self._vista
+        return vista.originales if vista else {}
+
+    def como_dict(self) -> Dict[str, Tuple[float, str]]:
+        return {orig: self.get(n) for n, orig in self.nombres().items()}
+
+def leer_snapshot(path: str = SNAPSHOT_PATH) -> Dict[str, Tuple[float, str]]:
+    """Contenido actual del snapshot (vacío si no existe)."""
+    lector = LectorSnapshot(path)
+    return lector.como_dict() if lector.asegurar() else {}
@@ -0,0 +1,9 @@
+-- Pares a los que se suscribió cada chat (/suscribir). bot_telegram envía la
+-- tarjeta del par a cada suscriptor después de cada corrida de tasas.
+create table if not exists public.suscripciones_pares (
+    chat_id bigint      not null,
+    user_id bigint      not null,  -- define el nivel de permiso de la tarjeta
+    par     text        not null,  -- como en nombre_tasa, ej. 'Chile - Venezuela' o 'COP USDT'
+    creado  timestamptz not null default now(),
+    primary key (chat_id, par)
+);
@@ -0,0 +1,11 @@
+-- Último valor por nombre_tasa. guardar_tasas hace upsert al final de cada
+-- corrida; los bots leen de aquí en lugar de recorrer la historia de "tasas".
+create table if not exists public.tasas_actuales (
+    nombre_tasa  text primary key,
+    valor        numeric   not null,
+    fecha_actual timestamp not null,  -- hora Venezuela, igual que tasas.fecha_actual
+    run_id       text      not null
+);
+
+create index if not exists tasas_actuales_fecha_idx
+    on public.tasas_actuales (fecha_actual desc);
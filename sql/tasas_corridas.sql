@@ -0,0 +1,13 @@
+-- Una fila por corrida de guardar_tasas, insertada después del upsert en
+-- tasas_actuales. Los bots escuchan los inserts por Realtime para enterarse
+-- de la corrida sin sondear (ver tiempo_real_tasas.py).
+create table if not exists public.tasas_corridas (
+    run_id    text primary key,
+    fecha_fin timestamp not null,  -- hora Venezuela
+    escritas  integer   not null,  -- filas insertadas en tasas
+    actuales  integer   not null   -- filas con upsert en tasas_actuales
+);
+
+-- Realtime solo emite cambios de las tablas de la publicación
+alter publication supabase_realtime add table public.tasas_corridas;
+alter publication supabase_realtime add table public.tasas_actuales;
@@ -0,0 +1,35 @@
+-- Fila más nueva por nombre_tasa de un día (hora Venezuela), para los bots.
+-- Uso desde Python: supabase.rpc("tasas_ultimas_del_dia", {"p_dia": "2025-01-31"}).execute()
+-- Paginado por nombre (lector_tasas.leer_ultimas_del_dia): p_despues = último nombre_tasa
+-- de la página anterior, p_limite = filas por página (<= max-rows de PostgREST).
+create index if not exists tasas_nombre_fecha_idx
+    on public.tasas (nombre_tasa, fecha_actual desc);
+
+-- La versión sin paginar tenía otra firma; se borra para que PostgREST no vea dos
+drop function if exists public.tasas_ultimas_del_dia(date, text, text);
+
+create or replace function public.tasas_ultimas_del_dia(
+    p_dia     date default null,  -- null = hoy en America/Caracas
+    p_prefijo text default null,  -- ej. 'Tasa full '
+    p_par     text default null,  -- ej. 'Chile - Venezuela'
+    p_despues text default null,  -- solo nombres mayores que este (página siguiente)
+    p_limite  int  default null   -- null = sin límite
+)
+returns table (nombre_tasa text, valor numeric, fecha_actual timestamp)
+language sql
+stable
+as $$
+    with dia as (
+        select coalesce(p_dia, (now() at time zone 'America/Caracas')::date) as d
+    )
+    select distinct on (t.nombre_tasa)
+           t.nombre_tasa::text, t.valor::numeric, t.fecha_actual::timestamp
+    from public.tasas t, dia
+    where t.fecha_actual >= dia.d
+      and t.fecha_actual <  dia.d + 1
+      and (p_prefijo is null or t.nombre_tasa ilike p_prefijo || '%')
+      and (p_par is null or t.nombre_tasa ilike '% ' || p_par)
+      and (p_despues is null or t.nombre_tasa > p_despues)
+    order by t.nombre_tasa, t.fecha_actual desc
+    limit p_limite;
+$$;
@@ -0,0 +1,26 @@
+"""Suscripciones de chats a pares de tasas (ver sql/suscripciones_pares.sql)."""
+from typing import Any, Dict, List
+
+TABLA_SUSCRIPCIONES = "suscripciones_pares"
+
+def suscribir(client, chat_id: int, user_id: int, par: str):
+    fila = {"chat_id": chat_id, "user_id": user_id, "par": par}
+    client.table(TABLA_SUSCRIPCIONES).upsert(fila, on_conflict="chat_id,par").execute()
+
+def desuscribir(client, chat_id: int, par: str = None) -> int:
+    """Quita ``par`` (o todos los pares si es None); devuelve cuántas se borraron."""
+    q = client.table(TABLA_SUSCRIPCIONES).delete().eq("chat_id", chat_id)
+    if par is not None: q = q.eq("par", par)
+    return len(q.execute().data or [])
+
+def suscripciones_de(client, chat_id: int) -> List[str]:
+    res = client.table(TABLA_SUSCRIPCIONES).select("par").eq("chat_id", chat_id).order("par").execute()
+    return [r["par"] for r in res.data or []]
+
+def todas_las_suscripciones(client, tam_pagina: int = 1000) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    while True:
+        data = (client.table(TABLA_SUSCRIPCIONES).select("chat_id, user_id, par")
+                .order("chat_id").order("par").range(len(out), len(out) + tam_pagina - 1).execute().data or [])
+        out.extend(data)
+        if len(data) < tam_pagina: return out
@@ -0,0 +1,416 @@
+"""Tarjetas de tasas del bot, armadas una vez por corrida.
+
+Cada par se renderiza para cada nivel de permiso (solo público, limitado,
+completo) cuando cambia el contenido de la caché de tasas; pedir una tarjeta
+queda en una búsqueda en un dict.
+"""
+import threading
+from decimal import Decimal, InvalidOperation, ROUND_DOWN
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config_pares import par_invertido
+from lector_tasas import CacheTasas
+from resolver_pares import CLAVE_COP_USDT, USDT, claves_en_texto, normalizar, resolver_par
+
+# ============ NORMALIZADORES + DECIMALES POR PAR (TRUNCADO) ============
+def _norm_pair(p: str) -> str:
+    """Clave de DECIMALS_BY_PAIR para ``p`` ("" si no se reconoce el par)."""
+    return resolver_par(p) or ""
+
+# Mapa de decimales por par normalizado (SIN ACENTOS, minúsculas)
+DECIMALS_BY_PAIR = {
+    "chile - venezuela": 4,
+    "chile - colombia": 3,
+    "chile - argentina": 3,
+    "chile - usa": 5,
+    "colombia - venezuela": 2,
+    "colombia - chile": 3,
+    "usa - venezuela": 1,
+    "usa - chile": 1,
+    "mexico - venezuela": 2,
+    "chile - mexico": 4,
+    "chile - peru": 4,
+    "argentina - peru": 4,
+    "argentina - venezuela": 3,
+    "colombia - argentina": 3,
+    "venezuela - colombia": 2,
+    "venezuela - argentina": 2,
+    "venezuela - usa": 5,
+    "usa - colombia": 2,
+    "venezuela - peru": 4,
+    "mexico - colombia": 1,
+    "mexico - argentina": 2,
+    "colombia - mexico": 3,
+    "argentina - chile": 3,
+    "colombia - peru": 5,
+    "panama - venezuela": 1,
+    "argentina - colombia": 2,
+    "ecuador - colombia": 1,
+    "ecuador - venezuela": 1,
+    "europa - venezuela": 1,
+    "europa - chile": 1,
+    "usa - peru": 3,
+    "usa - argentina": 3,
+    "uruguay - venezuela": 3,
+    "chile - panama": 5,
+    "chile - ecuador": 5,
+    "colombia usdt": 2,
+}
+
+@lru_cache(maxsize=None)
+def _cuantizador(decs: int) -> Decimal:
+    return Decimal("1." + ("0" * int(decs)))
+
+def _truncate_value(val, decs):
+    if val is None:
+        return None
+    if decs is None:
+        return float(val)
+    d = Decimal(str(val)).quantize(_cuantizador(decs), rounding=ROUND_DOWN)
+    return float(d)
+
+def _fmt_trunc(val, decs):
+    if val is None:
+        return "No disponible"
+    if decs is None:
+        return str(val)
+    tv = _truncate_value(val, decs)
+    return f"{tv:.{decs}f}"
+
+# ============ NIVELES DE PERMISO ============
+SOLO_PUBLICO = "solo_publico"
+LIMITADO = "limitado"  # USUARIOS_LIMITADOS y USUARIOS_RESTRINGIDOS ven lo mismo
+COMPLETO = "completo"
+NIVELES = (SOLO_PUBLICO, LIMITADO, COMPLETO)
+
+def nivel_usuario(user_id, solo_publico: Iterable[int], limitados: Iterable[int],
+                  restringidos: Iterable[int]) -> str:
+    if user_id in solo_publico: return SOLO_PUBLICO
+    if (user_id in limitados) or (user_id in restringidos): return LIMITADO
+    return COMPLETO
+
+# ============ TARJETAS ============
+Buscar = Callable[[str], Tuple[Optional[float], Optional[str]]]
+
+def _card_cop_usdt_full_may(pair_key_norm, full_act, full_prom, may_act, may_prom, hora):
+    line = "─" * 28
+    decs = DECIMALS_BY_PAIR.get(pair_key_norm)
+    f_act  = _fmt_trunc(full_act, decs)
+    f_prom = _fmt_trunc(full_prom, decs) if full_prom is not None else "No disponible"
+    m_act  = _fmt_trunc(may_act, decs)
+    m_prom = _fmt_trunc(may_prom, decs) if may_prom is not None else "No disponible"
+
+    return (
+        f"┌{line}┐\n"
+        f"│   💱  COP → USDT (P2P)        │\n"
+        f"├{line}┤\n"
+        f"│  • Tasa Full Actual: {f_act}        │\n"
+        f"│  • Tasa Full Promedio: {f_prom} │\n"
+        f"│  • Tasa Mayorista Actual: {m_act}     │\n"
+        f"│  • Tasa Mayorista Promedio: {m_prom} │\n"
+        f"├{line}┤\n"
+        f"│  🕒 Última actualización: {hora}   │\n"
+        f"└{line}┘"
+    )
+
+def _card_cop_usdt_may_only(pair_key_norm, may_act, may_prom, hora):
+    line = "─" * 28
+    decs = DECIMALS_BY_PAIR.get(pair_key_norm)
+    m_act  = _fmt_trunc(may_act, decs)
+    m_prom = _fmt_trunc(may_prom, decs) if may_prom is not None else "No disponible"
+
+    return (
+        f"┌{line}┐\n"
+        f"│   💱  COP → USDT (P2P)        │\n"
+        f"├{line}┤\n"
+        f"│  • Tasa Mayorista Actual: {m_act}     │\n"
+        f"│  • Tasa Mayorista Promedio: {m_prom} │\n"
+        f"├{line}┤\n"
+        f"│  🕒 Última actualización: {hora}   │\n"
+        f"└{line}┘"
+    )
+
+def _apply_fmt_pair_lines(pair_key_norm, lines: list[tuple[str, float | None]]):
+    decs = DECIMALS_BY_PAIR.get(pair_key_norm)
+    out = []
+    for label, val in lines:
+        out.append(f"{label}: {_fmt_trunc(val, decs)}")
+    return "\n".join(out)
+
+def tarjeta_cop_usdt(nivel: str, buscar: Buscar) -> str:
+    pair_key_norm = _norm_pair("colombia usdt")
+    full_act, hora = buscar("tasa full cop usdt")
+    may_act,  _    = buscar("tasa mayorista cop usdt")
+    full_prom, _   = buscar("tasa full promedio cop usdt")
+    may_prom, _    = buscar("tasa mayorista promedio cop usdt")
+
+    if full_act is None and may_act is None:
+        return "❌ No hay datos disponibles para COP USDT."
+
+    if nivel == SOLO_PUBLICO:
+        return (
+            "┌────────────────────────────┐\n"
+            "│   💱  COP → USDT (P2P)     │\n"
+            "├────────────────────────────┤\n"
+            f"│  • Tasa Público: No disponible           │\n"
+            f"│  • Tasa Público Promedio: No disponible  │\n"
+            "├────────────────────────────┤\n"
+            f"│  🕒 Última actualización: {hora or '--:--'}   │\n"
+            "└────────────────────────────┘"
+        )
+
+    if nivel == LIMITADO:
+        if may_act is None:
+            return "❌ No hay datos disponibles para COP USDT."
+        return _card_cop_usdt_may_only(pair_key_norm, may_act, may_prom, hora or "--:--")
+
+    if full_act is None or may_act is None:
+        return "❌ No hay datos suficientes disponibles para COP USDT."
+    return _card_cop_usdt_full_may(pair_key_norm, full_act, full_prom, may_act, may_prom, hora or "--:--")
+
+def tarjeta_par(nombre_par: str, nivel: str, buscar: Buscar) -> str:
+    tasa_full_actual, hora_actual = buscar(f"Tasa full {nombre_par}")
+    tasa_full_prom, _             = buscar(f"Tasa full promedio {nombre_par}")
+
+    tasa_may_actual, _            = buscar(f"Tasa mayorista {nombre_par}")
+    tasa_may_prom, _              = buscar(f"Tasa mayorista promedio {nombre_par}")
+
+    tasa_promo_actual, _          = buscar(f"Tasa promocional {nombre_par}")
+    tasa_promo_prom, _            = buscar(f"Tasa promocional promedio {nombre_par}")
+
+    tasa_pub_actual, _            = buscar(f"Tasa público {nombre_par}")
+    tasa_pub_prom, _              = buscar(f"Tasa público promedio {nombre_par}")
+
+    pair_key_norm = _norm_pair(nombre_par)
+
+    if nivel == SOLO_PUBLICO:
+        if tasa_pub_actual is None:
+            return "❌ No hay datos disponibles para ese par."
+        cuerpo = _apply_fmt_pair_lines(pair_key_norm, [
+            ("Tasa Público Actual", tasa_pub_actual),
+            ("Tasa Público Promedio", tasa_pub_prom),
+        ])
+        return (
+            f"📊 Tasas para {nombre_par}\n\n"
+            f"{cuerpo}\n\n"
+            f"🕒 Última actualización de datos: {hora_actual}"
+        )
+
+    if nivel == LIMITADO:
+        if tasa_pub_actual is None or tasa_may_actual is None:
+            return "❌ No hay datos disponibles para ese par."
+        cuerpo = _apply_fmt_pair_lines(pair_key_norm, [
+            ("Tasa Mayorista Actual", tasa_may_actual),
+            ("Tasa Mayorista Promedio", tasa_may_prom),
+            ("Tasa Promocional Actual", tasa_promo_actual),
+            ("Tasa Promocional Promedio", tasa_promo_prom),
+            ("Tasa Público Actual", tasa_pub_actual),
+            ("Tasa Público Promedio", tasa_pub_prom),
+        ])
+        return (
+            f"📊 Tasas para {nombre_par}\n\n"
+            f"{cuerpo}\n\n"
+            f"🕒 Última actualización de datos: {hora_actual}"
+        )
+
+    if tasa_full_actual is None or tasa_pub_actual is None or tasa_may_actual is None:
+        return "❌ No hay datos suficientes disponibles para ese par."
+
+    cuerpo = _apply_fmt_pair_lines(pair_key_norm, [
+        ("Tasa Full Actual", tasa_full_actual),
+        ("Tasa Full Promedio", tasa_full_prom),
+        ("Tasa Mayorista Actual", tasa_may_actual),
+        ("Tasa Mayorista Promedio", tasa_may_prom),
+        ("Tasa Promocional Actual", tasa_promo_actual),
+        ("Tasa Promocional Promedio", tasa_promo_prom),
+        ("Tasa Público Actual", tasa_pub_actual),
+        ("Tasa Público Promedio", tasa_pub_prom),
+    ])
+    return (
+        f"📊 Tasas para {nombre_par}\n\n"
+        f"{cuerpo}\n\n"
+        f"🕒 Última actualización de datos: {hora_actual}"
+    )
+
+# ============ CONVERSIÓN ============
+TIPOS_CONVERSION = {
+    "full": "full", "publico": "público", "pub": "público",
+    "mayorista": "mayorista", "may": "mayorista", "promocional": "promocional", "promo": "promocional",
+}
+# Lo mismo que muestra la tarjeta de cada nivel
+TIPOS_POR_NIVEL = {
+    SOLO_PUBLICO: {"público"},
+    LIMITADO: {"mayorista", "promocional", "público"},
+    COMPLETO: {"full", "mayorista", "promocional", "público"},
+}
+USO_CONVERTIR = (
+    "✍️ Uso: /convertir <monto> <origen> <destino> [tipo]\n"
+    "Ej: /convertir 100000 chile venezuela mayorista\n"
+    "Tipos: full, mayorista, promocional, público (por defecto; en COP USDT, mayorista o full)."
+)
+
+def _es_miles(t: str, sep: str) -> bool:
+    """Un solo tipo de separador: es de miles si se repite en grupos de tres o si lo siguen justo tres dígitos."""
+    if t.count(sep) > 1: return all(len(g) == 3 for g in t.split(sep)[1:])
+    entero, _, dec = t.partition(sep)
+    return len(dec) == 3 and entero.lstrip("0") != ""
+
+def _monto(txt: str) -> Optional[Decimal]:
+    """Monto escrito como 1500, 1500.5, 1500,5, 1.500,50, 1,500.50, 100.000, 1.000.000 o 10,000.
+
+    Con un solo tipo de separador, "100.000" y "10,000" son miles; "0.500" y "1500,5" decimales.
+    """
+    t = txt.strip()
+    if "," in t and "." in t:
+        t = t.replace(".", "").replace(",", ".") if t.rfind(",") > t.rfind(".") else t.replace(",", "")
+    else:
+        sep = "," if "," in t else "."
+        t = t.replace(sep, "") if _es_miles(t, sep) else t.replace(",", ".")
+    try:
+        d = Decimal(t)
+    except InvalidOperation:
+        return None
+    return d if d.is_finite() and d > 0 else None
+
+def _fmt_monto(d: Decimal) -> str:
+    # Truncado como las tasas: nunca se muestra más de lo que da la cuenta
+    return f"{d.quantize(_cuantizador(2), rounding=ROUND_DOWN):,.2f}"
+
+# ============ TARJETAS PRE-ARMADAS ============
+COP_USDT = "cop usdt"
+_PREFIJOS = ("tasa full ", "tasa mayorista ", "tasa promocional ", "tasa público ")
+
+def clave_par(nombre_par: str) -> str:
+    return nombre_par.strip().lower().replace("/", " ").replace("  ", " ")
+
+def pares_en_cache(nombres: Iterable[str]) -> Dict[str, str]:
+    """clave -> nombre del par como aparece en nombre_tasa (sin COP USDT)."""
+    pares: Dict[str, str] = {}
+    for original in nombres:
+        bajo = original.lower()
+        for pref in _PREFIJOS:
+            if not bajo.startswith(pref): continue
+            resto = original[len(pref):]
+            if resto.lower().startswith("promedio "): resto = resto[len("promedio "):]
+            if clave_par(resto) != COP_USDT: pares.setdefault(clave_par(resto), resto)
+            break
+    return pares
+
+class TarjetasTasas:
+    """Tarjetas de todos los pares × niveles, rehechas cuando cambia la caché."""
+
+    def __init__(self, cache: CacheTasas):
+        self.cache = cache
+        self.tarjetas: Dict[Tuple[str, str], str] = {}
+        self.pares: Dict[str, str] = {}
+        self.por_norma: Dict[str, str] = {}  # _norm_pair(par) -> par
+        self._generacion: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _armar(self):
+        buscar = self.cache.get
+        pares = pares_en_cache(list(self.cache.nombres.values()))
+        tarjetas = {(COP_USDT, n): tarjeta_cop_usdt(n, buscar) for n in NIVELES}
+        for clave, par in pares.items():
+            for n in NIVELES:
+                tarjetas[(clave, n)] = tarjeta_par(par, n, buscar)
+        self.tarjetas, self.pares = tarjetas, pares
+        self.por_norma = {_norm_pair(par) or clave: par for clave, par in pares.items()}
+        print(f"🃏 Tarjetas armadas: {len(pares)} pares × {len(NIVELES)} niveles (run {self.cache.run_id}).")
+
+    def asegurar(self):
+        self.cache.asegurar()
+        if self._generacion == self.cache.generacion: return
+        with self._lock:
+            generacion = self.cache.generacion
+            if self._generacion == generacion: return
+            self._armar()
+            self._generacion = generacion
+
+    def par_canonico(self, nombre_par: str) -> Optional[str]:
+        """Nombre del par como está en la caché (o "COP USDT"); None si hoy no hay datos."""
+        self.asegurar()
+        clave = resolver_par(nombre_par)
+        if clave == CLAVE_COP_USDT or clave_par(nombre_par) == COP_USDT: return "COP USDT"
+        return self.por_norma.get(clave) or self.pares.get(clave_par(nombre_par))
+
+    def buscar_pares(self, texto: str, limite: int = 10) -> List[str]:
+        """Pares de hoy que coinciden con texto libre ("clp ves", "peru", "zelle")."""
+        self.asegurar()
+        if not texto.strip(): return (["COP USDT"] + sorted(self.pares.values()))[:limite]
+        exacto = self.par_canonico(texto)
+        if exacto: return [exacto]
+        claves = claves_en_texto(texto)
+        if not claves: return []
+        # Un solo país, o un par sin datos hoy: todos los pares con esos países (incluye el inverso)
+        encontrados = sorted(par for norma, par in self.por_norma.items()
+                             if all(c in norma.split(" - ") for c in claves))
+        if set(claves) <= {"colombia", USDT}: encontrados.insert(0, "COP USDT")
+        return encontrados[:limite]
+
+    def obtener(self, nombre_par: str, nivel: str) -> str:
+        """Tarjeta ya armada; si el par no está en la caché se arma al vuelo (mensaje de sin datos)."""
+        self.asegurar()
+        clave = clave_par(self.par_canonico(nombre_par) or nombre_par)
+        tarjeta = self.tarjetas.get((clave, nivel))
+        if tarjeta is not None: return tarjeta
+        if clave == COP_USDT: return tarjeta_cop_usdt(nivel, self.cache.get)
+        return tarjeta_par(nombre_par.strip(), nivel, self.cache.get)
+
+    def convertir(self, args: str, nivel: str) -> str:
+        """Respuesta de /convertir <monto> <origen> <destino> [tipo], con la tasa de la caché."""
+        partes = args.split()
+        if len(partes) < 2: return USO_CONVERTIR
+        monto = _monto(partes[0])
+        if monto is None: return f"❌ Monto inválido: {partes[0]!r}.\n\n{USO_CONVERTIR}"
+        resto = partes[1:]
+        tipo = TIPOS_CONVERSION.get(" ".join(normalizar(resto[-1]))) if len(resto) > 1 else None
+        if tipo is not None: resto = resto[:-1]
+        texto_par = " ".join(resto)
+        clave = resolver_par(texto_par)
+        if clave is None: return f"❌ No reconozco el par {texto_par!r}.\n\n{USO_CONVERTIR}"
+        if tipo is None:
+            # COP USDT no tiene público: mayorista, o full si el nivel no ve mayorista
+            if clave == CLAVE_COP_USDT:
+                tipo = next((t for t in ("mayorista", "full") if t in TIPOS_POR_NIVEL[nivel]), "mayorista")
+            else: tipo = "público"
+        if tipo not in TIPOS_POR_NIVEL[nivel]: return f"⛔️ No tienes acceso a la tasa {tipo}."
+
+        if clave == CLAVE_COP_USDT:
+            if tipo not in ("full", "mayorista"): return "❌ COP USDT solo tiene tasa full y mayorista."
+            nombre = f"Tasa {tipo} COP USDT"
+            # La tasa es COP por USDT: de COP a USDT se divide
+            dividir = claves_en_texto(texto_par)[0] == "colombia"
+            origen, destino = ("COP", "USDT") if dividir else ("USDT", "COP")
+        else:
+            par = self.par_canonico(texto_par)
+            if par is None: return "❌ No hay datos disponibles para ese par."
+            nombre = f"Tasa {tipo} {par}"
+            dividir = par_invertido(par)
+            origen, destino = par.split(" - ")
+
+        self.asegurar()
+        valor, hora = self.cache.get(nombre)
+        if valor is None: return f"❌ No hay {nombre} disponible hoy."
+        decs = DECIMALS_BY_PAIR.get(clave)
+        tasa = Decimal(str(_truncate_value(valor, decs)))
+        if tasa <= 0: return f"❌ {nombre} no es válida para convertir."
+        recibe = monto / tasa if dividir else monto * tasa
+        return (
+            f"💱 {_fmt_monto(monto)} {origen} → {_fmt_monto(recibe)} {destino}\n"
+            f"📌 {nombre}: {_fmt_trunc(valor, decs)} ({'÷' if dividir else '×'})\n"
+            f"🕒 Última actualización de datos: {hora}"
+        )
+
+def texto_estadisticas(cache: CacheTasas, tarjetas: "TarjetasTasas") -> str:
+    """Resumen para /stats: estado de la caché y consultas deduplicadas."""
+    v = cache.estadisticas_vuelos()
+    ahorro = (100.0 * v["compartidas"] / v["llamadas"]) if v["llamadas"] else 0.0
+    return (
+        f"📈 Caché de tasas\n"
+        f"• Run: {cache.run_id or '-'} | generación {cache.generacion}\n"
+        f"• Tasas de hoy: {len(cache.nombres)} | tarjetas: {len(tarjetas.tarjetas)}\n"
+        f"• Consultas a la base: {v['ejecuciones']} de {v['llamadas']} pedidas "
+        f"({v['compartidas']} compartidas, {ahorro:.0f}% ahorro)"
+    )
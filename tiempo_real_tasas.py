@@ -0,0 +1,132 @@
+"""Avisos en vivo de corridas de tasas para la caché de los bots.
+
+Escucha por Supabase Realtime los cambios de ``tasas_actuales`` (una fila por
+tasa, se aplica apenas llega) y los inserts de ``tasas_corridas`` (fin de la
+corrida). Corre en un hilo daemon con su propio event loop; si la conexión
+se cae, la caché vuelve a sondear el run_id (CacheTasas.asegurar) hasta que
+se reconecta.
+
+REALTIME_URL permite apuntar a otro servidor websocket (por ejemplo uno
+local para pruebas); por defecto se deriva de SUPABASE_URL.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from lector_tasas import CacheTasas, TABLA_ACTUALES
+
+TABLA_CORRIDAS = "tasas_corridas"
+
+REALTIME_ACTIVO = os.getenv("REALTIME_TASAS", "1") == "1"
+REALTIME_URL = os.getenv("REALTIME_URL", "")
+REALTIME_REINTENTO_S = float(os.getenv("REALTIME_REINTENTO_S", "5"))
+REALTIME_REINTENTO_MAX_S = float(os.getenv("REALTIME_REINTENTO_MAX_S", "300"))
+# Una conexión que duró al menos esto vuelve la espera de reintento a su valor base
+REALTIME_ESTABLE_S = float(os.getenv("REALTIME_ESTABLE_S", "60"))
+REALTIME_VIGILANCIA_S = 5.0
+
+def url_realtime(supabase_url: str) -> str:
+    return supabase_url.rstrip("/").replace("https://", "wss://").replace("http://", "ws://") + "/realtime/v1"
+
+def _registro(payload: Dict[str, Any]) -> Dict[str, Any]:
+    # Según la versión del cliente el cambio viene en payload["data"] o directo
+    datos = payload.get("data", payload) if isinstance(payload, dict) else {}
+    return {"tabla": datos.get("table"), "record": datos.get("record") or datos.get("new") or {}}
+
+async def _esperar_desconexion(cliente):
+    """Vuelve cuando se cae el websocket.
+
+    En realtime 2.x ``listen()`` no bloquea: ``connect()`` deja una tarea leyendo
+    el socket (``_listen_task``) que termina cuando la conexión se cierra.
+    """
+    tarea = getattr(cliente, "_listen_task", None)
+    if tarea is None:
+        await cliente.listen()  # versiones donde listen() sí bloquea
+        tarea = getattr(cliente, "_listen_task", None)
+    if tarea is not None:
+        await tarea
+        return
+    while getattr(cliente, "is_connected", False):
+        await asyncio.sleep(REALTIME_VIGILANCIA_S)
+
+class EscuchaTasas:
+    """Mantiene ``cache`` al día con los avisos de Realtime."""
+
+    def __init__(self, cache: CacheTasas, url: str, clave: str):
+        self.cache = cache
+        self.url = url
+        self.clave = clave
+        self.eventos = 0
+        self.conectado_desde: Optional[float] = None
+        self._hilo: Optional[threading.Thread] = None
+
+    def manejar(self, payload: Dict[str, Any]):
+        """Aplica un aviso de cambio (callback de los canales)."""
+        ev = _registro(payload)
+        rec = ev["record"]
+        if not rec: return
+        self.eventos += 1
+        if ev["tabla"] == TABLA_CORRIDAS:
+            self.cache.marcar_run(rec.get("run_id"), rec.get("actuales"))
+            print(f"📡 Corrida {rec.get('run_id')} recibida en vivo ({rec.get('actuales')} tasas).")
+        else:
+            self.cache.aplicar([rec])
+
+    async def _escuchar_una_vez(self):
+        from realtime import AsyncRealtimeClient
+
+        cliente = AsyncRealtimeClient(self.url, self.clave, auto_reconnect=False)
+        await cliente.connect()
+        try:
+            canal = cliente.channel("tasas-bots")
+            canal.on_postgres_changes("*", schema="public", table=TABLA_ACTUALES, callback=self.manejar)
+            canal.on_postgres_changes("INSERT", schema="public", table=TABLA_CORRIDAS, callback=self.manejar)
+            await canal.subscribe()
+            # Lo que pasó mientras no había conexión se recupera con una recarga
+            await asyncio.to_thread(self.cache.recargar)
+            self.cache.en_vivo = True
+            self.conectado_desde = time.monotonic()
+            print(f"📡 Escuchando corridas de tasas en vivo ({self.url}).")
+            await _esperar_desconexion(cliente)
+            print("⚠️ Realtime: la conexión se cerró.")
+        finally:
+            self.cache.en_vivo = False
+            try:
+                await cliente.close()
+            except Exception:
+                pass
+
+    async def _escuchar(self):
+        espera = REALTIME_REINTENTO_S
+        while True:
+            self.conectado_desde = None
+            try:
+                await self._escuchar_una_vez()
+            except Exception as e:
+                print(f"⚠️ Realtime desconectado, se sondea cada {self.cache.sondeo_s:.0f}s: {e}")
+            # Solo una conexión que se sostuvo reinicia la espera; si no, sigue creciendo
+            if self.conectado_desde is not None and time.monotonic() - self.conectado_desde >= REALTIME_ESTABLE_S:
+                espera = REALTIME_REINTENTO_S
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, REALTIME_REINTENTO_MAX_S)
+
+    def iniciar(self) -> threading.Thread:
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=lambda: asyncio.run(self._escuchar()),
+                                          name="realtime-tasas", daemon=True)
+            self._hilo.start()
+        return self._hilo
+
+def escuchar_en_vivo(cache: CacheTasas, supabase_url: str, clave: str) -> Optional[EscuchaTasas]:
+    """Arranca la escucha si REALTIME_TASAS está activo y el cliente realtime está instalado."""
+    if not REALTIME_ACTIVO: return None
+    try:
+        import realtime  # noqa: F401
+    except ImportError:
+        print("⚠️ Paquete realtime no instalado; la caché de tasas queda con sondeo.")
+        return None
+    escucha = EscuchaTasas(cache, REALTIME_URL or url_realtime(supabase_url), clave)
+    escucha.iniciar()
+    return escucha
@@ -0,0 +1,79 @@
+"""Vuelo único (singleflight): llamadas idénticas concurrentes comparten una sola ejecución.
+
+El primero que pide una clave ejecuta la función; los que llegan mientras
+sigue en curso esperan y reciben el mismo resultado (o la misma excepción).
+Apenas termina, la clave queda libre y la próxima llamada vuelve a ejecutar.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class _Vuelo:
+    __slots__ = ("listo", "resultado", "error")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado: Any = None
+        self.error: BaseException = None
+
+class _Contadores:
+    def __init__(self):
+        self.llamadas = 0
+        self.ejecuciones = 0
+        self.compartidas = 0  # llamadas que se ahorraron su propia ejecución
+
+    def estadisticas(self) -> Dict[str, int]:
+        return {"llamadas": self.llamadas, "ejecuciones": self.ejecuciones, "compartidas": self.compartidas}
+
+class VueloUnico(_Contadores):
+    """Para hilos."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._vuelos: Dict[Hashable, _Vuelo] = {}
+
+    def hacer(self, clave: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            self.llamadas += 1
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+                self.ejecuciones += 1
+            else:
+                self.compartidas += 1
+        if not lider:
+            vuelo.listo.wait()
+            if vuelo.error is not None: raise vuelo.error
+            return vuelo.resultado
+        try:
+            vuelo.resultado = fn(*args, **kwargs)
+            return vuelo.resultado
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                self._vuelos.pop(clave, None)
+            vuelo.listo.set()
+
+class VueloUnicoAsync(_Contadores):
+    """Para asyncio (un solo event loop). La ejecución corre en su propia task,
+    así que cancelar a quien la inició no cancela a los demás que esperan."""
+
+    def __init__(self):
+        super().__init__()
+        self._vuelos: Dict[Hashable, asyncio.Task] = {}
+
+    async def hacer(self, clave: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        self.llamadas += 1
+        task = self._vuelos.get(clave)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._vuelos[clave] = task
+            task.add_done_callback(lambda _t: self._vuelos.pop(clave, None))
+            self.ejecuciones += 1
+        else:
+            self.compartidas += 1
+        return await asyncio.shield(task)
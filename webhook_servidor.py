@@ -0,0 +1,103 @@
+"""Modo webhook para los bots de telebot.
+
+Un servidor aiohttp recibe los updates de Telegram, verifica el secret token
+(cabecera X-Telegram-Bot-Api-Secret-Token), responde 200 de inmediato y
+reparte el procesamiento en un pool de hilos. Cada chat va siempre al mismo
+hilo, así que sus mensajes se atienden en orden mientras chats distintos se
+atienden en paralelo.
+
+El bot debe crearse con ``threaded=False``: los handlers corren directo en
+los hilos del pool.
+"""
+import hmac
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import telebot
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")           # ej. https://tasanator.onrender.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT") or os.getenv("PORT") or "8080")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_MAX_CONEXIONES = int(os.getenv("WEBHOOK_MAX_CONEXIONES", "40"))
+
+CABECERA_SECRETO = "X-Telegram-Bot-Api-Secret-Token"
+
+def chat_de_update(update: telebot.types.Update) -> int:
+    """Id que fija el hilo del update (chat, o usuario si no hay chat)."""
+    for campo in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        m = getattr(update, campo, None)
+        if m is not None: return m.chat.id
+    cq = getattr(update, "callback_query", None)
+    if cq is not None: return cq.message.chat.id if cq.message else cq.from_user.id
+    for campo in ("inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query"):
+        q = getattr(update, campo, None)
+        if q is not None: return q.from_user.id
+    return update.update_id
+
+class DespachadorPorChat:
+    """Un hilo por shard; el shard sale del chat id."""
+
+    def __init__(self, bot: telebot.TeleBot, workers: int = WEBHOOK_WORKERS):
+        self.bot = bot
+        self._shards: List[ThreadPoolExecutor] = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"webhook-{i}") for i in range(max(1, workers))
+        ]
+
+    def _procesar(self, update: telebot.types.Update):
+        try:
+            self.bot.process_new_updates([update])
+        except Exception as e:
+            print(f"⚠️ Error procesando update {update.update_id}: {e}")
+
+    def despachar(self, update: telebot.types.Update):
+        shard = self._shards[hash(chat_de_update(update)) % len(self._shards)]
+        shard.submit(self._procesar, update)
+
+    def cerrar(self):
+        for s in self._shards: s.shutdown(wait=True)
+
+def crear_app(despachador: DespachadorPorChat, secreto: str = WEBHOOK_SECRET, path: str = WEBHOOK_PATH):
+    from aiohttp import web
+
+    async def recibir(request: "web.Request") -> "web.Response":
+        if secreto and not hmac.compare_digest(request.headers.get(CABECERA_SECRETO, ""), secreto):
+            return web.Response(status=401)
+        try:
+            update = telebot.types.Update.de_json(json.loads(await request.text()))
+        except Exception as e:
+            print(f"⚠️ Update inválido en el webhook: {e}")
+            return web.Response(status=400)
+        if update is not None: despachador.despachar(update)
+        return web.Response(text="ok")
+
+    async def salud(_request):
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_post(path, recibir)
+    app.router.add_get("/salud", salud)
+    return app
+
+def servir_webhook(bot: telebot.TeleBot, url_publica: str = WEBHOOK_URL, secreto: str = WEBHOOK_SECRET,
+                   path: str = WEBHOOK_PATH, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT,
+                   workers: int = WEBHOOK_WORKERS, max_conexiones: Optional[int] = WEBHOOK_MAX_CONEXIONES):
+    """Registra el webhook en Telegram y atiende updates hasta que se detenga el proceso."""
+    from aiohttp import web
+
+    if not url_publica:
+        raise RuntimeError("WEBHOOK_URL no está definido.")
+    if not secreto:
+        print("⚠️ WEBHOOK_SECRET vacío: cualquiera que conozca la URL puede enviar updates.")
+    despachador = DespachadorPorChat(bot, workers)
+    bot.set_webhook(url=url_publica.rstrip("/") + path, secret_token=secreto or None,
+                    max_connections=max_conexiones, drop_pending_updates=True)
+    print(f"🌐 Webhook en {url_publica.rstrip('/')}{path} | escuchando {host}:{port} con {workers} workers")
+    try:
+        web.run_app(crear_app(despachador, secreto, path), host=host, port=port, print=None)
+    finally:
+        despachador.cerrar()